@@ -1,26 +1,47 @@
+import ast
 import collections
 import hashlib
+import io
+import itertools
 import json
 import logging
 import os
 import pickle
+import re
+import tokenize
 
 import networkx as nx
-from pycel.excelformula import ExcelFormula
+import numpy as np
+from pycel.excelformula import EVAL_REGEX, ExcelFormula
 from pycel.excelutil import (
     AddressCell,
     AddressRange,
+    as_error,
+    CriteriaColumn,
+    DIV0,
+    ExcelError,
     flatten,
     list_like,
+    RangeValue,
     VALUE_ERROR,
 )
 from pycel.excelwrapper import ExcelOpxWrapper
+from pycel.lib.function_traits import (
+    function_traits_data,
+    shared_call_functions,
+)
 from ruamel.yaml import YAML
 
 REF_START = '=_REF_("'
 REF_END = '")'
 REF_FORMAT = REF_START + '{}' + REF_END
 
+# sheet holding the cells built by common subexpression elimination
+CSE_SHEET = '_CSE_'
+
+# stands in for a referenced cell which is not yet in the cell_map
+_UnbuiltReference = collections.namedtuple('_UnbuiltReference', 'address value')
+
 
 class ExcelCompiler:
     """Class responsible for taking an Excel spreadsheet and compiling it
@@ -30,6 +51,10 @@ class ExcelCompiler:
 
     save_file_extensions = ('pkl', 'pickle', 'yml', 'yaml', 'json')
 
+    # functions whose result depends only on their arguments, and is always
+    # a single value, so identical calls can be shared between formulas
+    cse_functions = shared_call_functions
+
     def __init__(self, filename=None, excel=None):
 
         self.eval = None
@@ -61,13 +86,23 @@ class ExcelCompiler:
         self.graph_todos = []
         self.range_todos = []
 
+        # cell address to _VectorRun, for cells evaluated with numpy
+        self.vector_runs = {}
+
+        # cell address to _ColumnTotals, for totals from prefix sums
+        self.column_totals = {}
+
+        # row values of evaluated ranges, shared by overlapping ranges
+        self._range_rows = _RangeRows()
+
         self.extra_data = None
         self._formula_cells_list = None
 
     def __getstate__(self):
         # code objects are not serializable
         state = dict(self.__dict__)
-        for to_remove in 'eval excel log graph_todos range_todos'.split():
+        for to_remove in ('eval excel log graph_todos range_todos '
+                          '_range_rows').split():
             if to_remove in state:    # pragma: no branch
                 state[to_remove] = None
         return state
@@ -75,6 +110,7 @@ class ExcelCompiler:
     def __setstate__(self, d):
         self.__dict__.update(d)
         self.log = logging.getLogger('pycel')
+        self._range_rows = _RangeRows()
 
     @staticmethod
     def _compute_file_md5_digest(filename):
@@ -108,6 +144,9 @@ class ExcelCompiler:
         def cell_value(a_cell):
             if a_cell.formula and a_cell.formula.python_code:
                 return '=' + a_cell.formula.python_code
+            elif isinstance(a_cell.value, ExcelError):
+                # the text formats have no error type, save the error code
+                return str(a_cell.value)
             else:
                 return a_cell.value
 
@@ -343,6 +382,7 @@ class ExcelCompiler:
             assert address in self.cell_map
 
         cell_or_range = self.cell_map[address]
+        value = as_error(value)
 
         if cell_or_range.value != value:  # pragma: no branch
             # need to be able to 'set' an empty cell
@@ -360,6 +400,8 @@ class ExcelCompiler:
             return
         self.log.info("Resetting {}".format(cell.address))
         cell.value = None
+        if isinstance(cell, _Cell):
+            self._range_rows.reset(cell.address)
 
         if cell in self.dep_graph:
             for child_cell in self.dep_graph.successors(cell):
@@ -376,8 +418,13 @@ class ExcelCompiler:
 
     def recalculate(self):
         """Recalculate all of the known cells"""
+        self._range_rows.clear()
         for cell in self.cell_map.values():
-            if isinstance(cell, _CellRange) or cell.formula:
+            if isinstance(cell, _CellRange):
+                # ranges of only constants are unchanged, keep their values
+                if not self._is_constant_range(cell):
+                    cell.value = None
+            elif cell.formula:
                 cell.value = None
 
         for cell in self.cell_map.values():
@@ -429,7 +476,9 @@ class ExcelCompiler:
                 if child_address not in processed_cells:  # pragma: no branch
                     processed_cells.add(child_address)
                     child_cell = self.cell_map[child_address]
-                    if child_address in needed_cells or ':' in child_address:
+                    if child_address in needed_cells or \
+                            ':' in child_address or \
+                            child_cell.sheet == CSE_SHEET:
                         walk_precedents(child_cell)
                     else:
                         # trim this cell, now we will need only its value
@@ -452,6 +501,222 @@ class ExcelCompiler:
         for addr in cells_to_remove:
             del self.cell_map[addr]
 
+    def eliminate_common_subexpressions(self):
+        """ Evaluate identical function calls found in several formulas once
+
+        Calls to `cse_functions` which have identical arguments (constants
+        and cell references) are moved into cells on the CSE_SHEET, and the
+        formulas are changed to refer to these cells.  The new cells are in
+        the dependency graph, so they are reset and recalculated like any
+        other cell.
+
+        :return: dict of the python code of the shared calls to the number
+            of times each was found
+        """
+        cells = [cell for cell in self.cell_map.values()
+                 if isinstance(cell, _Cell) and cell.python_code]
+        shared = {cell.python_code: cell for cell in cells
+                  if cell.sheet == CSE_SHEET}
+
+        def call_spans(code, is_shared):
+            return _pure_call_spans(
+                code, self.cse_functions, include_root=not is_shared)
+
+        counts = collections.Counter(
+            cell.python_code[start:end] for cell in cells
+            for start, end in call_spans(
+                cell.python_code, cell.sheet == CSE_SHEET))
+
+        # longest first, so calls are hoisted before any calls they contain
+        hoisted = {}
+        for code in sorted(counts, key=len, reverse=True):
+            uses = counts[code]
+            if uses > 1 or uses and code in shared:
+                hoisted[code] = uses
+
+                # the calls inside this call will now be evaluated only once
+                uses -= code not in shared
+                for start, end in call_spans(code, True):
+                    counts[code[start:end]] -= uses
+
+        # build the cells for the new shared calls
+        row = max((cell.address.row for cell in shared.values()), default=0)
+        new_cells = []
+        for code in hoisted:
+            if code not in shared:
+                row += 1
+                address = AddressCell((1, row, 1, row), sheet=CSE_SHEET)
+                shared[code] = _Cell(address, formula='=' + code)
+                self.cell_map[address.address] = shared[code]
+                self.dep_graph.add_node(shared[code])
+                self.dep_graph.node[shared[code]]['sheet'] = CSE_SHEET
+                self.dep_graph.node[shared[code]]['label'] = \
+                    address.coordinate
+                new_cells.append(shared[code])
+
+        # replace the outermost hoisted calls with references to their cells
+        for cell in cells + new_cells:
+            code = cell.python_code
+            is_shared = cell.sheet == CSE_SHEET
+            to_replace = []
+            for start, end in call_spans(code, is_shared):
+                if code[start:end] in hoisted and not (
+                        to_replace and start < to_replace[-1][1]):
+                    to_replace.append((start, end))
+
+            if not to_replace and cell not in new_cells:
+                continue
+
+            for start, end in reversed(to_replace):
+                code = '{}_C_("{}"){}'.format(
+                    code[:start], shared[code[start:end]].address, code[end:])
+
+            old_needed = set(cell.needed_addresses)
+            cell.formula.python_code = code
+            for address in old_needed - set(cell.needed_addresses):
+                precedent = self.cell_map.get(address.address)
+                if self.dep_graph.has_edge(precedent, cell):
+                    self.dep_graph.remove_edge(precedent, cell)
+
+            for address in cell.needed_addresses:
+                if address.address not in self.cell_map:
+                    self._gen_graph(address, recursed=True)
+                self.dep_graph.add_edge(self.cell_map[address.address], cell)
+        self._process_gen_graph()
+
+        # cells with values expect their precedents to have values
+        for cell in new_cells:
+            if any(child.value is not None
+                   for child in self.dep_graph.successors(cell)):
+                self._evaluate(cell.address.address)
+
+        self.log.info(
+            "Common subexpressions: %s duplicates merged into %s cells" % (
+                sum(hoisted.values()) - len(new_cells), len(new_cells)))
+        return hoisted
+
+    def memoize_functions(self, names=None, maxsize=1024):
+        """ Cache the results of calls to pure library functions
+
+        Calls with identical arguments return the cached result.  Ranges
+        are identified by their current value, so a reset range is a new
+        argument.  Worthwhile for expensive functions called with repeated
+        arguments, check the `hit_rate` of each to see where it pays off.
+
+        :param names: python function names, defaults to all the pure
+            functions without lazy arguments
+        :param maxsize: the size of the cache for each function
+        :return: dict of function name to its `MemoizedFunction`, which
+            has `hits`, `misses` and `hit_rate`
+        """
+        if names is None:
+            names = [name for name, traits in function_traits_data.items()
+                     if traits.pure and traits.lazy is None]
+        return self._eval_context().memoize(names, maxsize=maxsize)
+
+    def vectorize_filled_columns(self, min_length=8):
+        """ Evaluate columns filled down with arithmetic formulas together
+
+        Contiguous cells in a column whose formulas differ only in the
+        cells they refer to, and which only add, subtract, multiply and
+        divide, are evaluated as one run with numpy.  Rows with anything
+        other than numbers as inputs are evaluated one at a time as usual.
+        Runs whose cells refer to other cells in the run are not used.
+
+        :param min_length: the shortest run worth evaluating together
+        :return: list of the `AddressRange` of each run
+        """
+        columns = {}
+        for cell in self.cell_map.values():
+            if isinstance(cell, _Cell) and cell.python_code:
+                parsed = _VectorRun.parse(cell.python_code)
+                if parsed is not None:
+                    columns.setdefault(
+                        (cell.sheet, cell.address.col_idx), []).append(
+                        (cell.address.row, cell, parsed))
+
+        self.vector_runs = {}
+        runs = []
+        for column in columns.values():
+            column.sort(key=lambda x: x[0])
+            start = 0
+            for i in range(1, len(column) + 1):
+                if i < len(column) and column[i][0] == column[i - 1][0] + 1 \
+                        and column[i][2][0] == column[start][2][0]:
+                    continue
+
+                to_run, start = column[start:i], i
+                addresses = {cell.address.address for _, cell, _ in to_run}
+                if len(to_run) < min_length or any(
+                        address in addresses
+                        for _, _, (_, refs) in to_run for address in refs):
+                    continue
+
+                run = _VectorRun(
+                    to_run[0][2][0],
+                    [cell for _, cell, _ in to_run],
+                    {cell: refs for _, cell, (_, refs) in to_run},
+                )
+                for address in addresses:
+                    self.vector_runs[address] = run
+                runs.append(run.address)
+
+        self.log.info("Vectorized %s cells in %s runs" % (
+            len(self.vector_runs), len(runs)))
+        return runs
+
+    def total_columns(self, min_length=8):
+        """ Evaluate SUMs, COUNTs and AVERAGEs of a column with prefix sums
+
+        Formulas which are only the SUM, COUNT or AVERAGE of a range in a
+        column, such as running totals (=SUM($B$2:B2) filled down) or
+        sliding windows, are grouped by that column.  The column is summed
+        cumulatively once, and each total is the difference of two of the
+        cumulative sums.  So filled down running totals are O(n) instead of
+        O(n^2).  Totals of ranges with errors, or with numbers which are not
+        exact as floats, are evaluated as usual.
+
+        :param min_length: the fewest formulas on a column worth totaling
+        :return: list of the `AddressRange` of each totaled column
+        """
+        columns = {}
+        for cell in self.cell_map.values():
+            if isinstance(cell, _Cell) and cell.python_code:
+                parsed = _ColumnTotals.parse(cell.python_code)
+                if parsed is not None:
+                    address = parsed[1]
+                    columns.setdefault(
+                        (address.sheet, address.col_idx), []).append(
+                        (cell, parsed))
+
+        self.column_totals = {}
+        totaled = []
+        for (sheet, col_idx), column in columns.items():
+            first = min(address.row for _, (_, address) in column)
+            last = max(address.end.row for _, (_, address) in column)
+            address = AddressRange((col_idx, first, col_idx, last), sheet=sheet)
+            if len(column) < min_length or any(
+                    cell.sheet == sheet and cell.address in address
+                    for cell, _ in column):
+                continue
+
+            self._gen_graph(address.address)
+            cell_range = self.cell_map[address.address]
+            totals = _ColumnTotals(cell_range, {
+                cell.address.address: (
+                    func, rng.row - first, rng.end.row - first + 1)
+                for cell, (func, rng) in column
+            })
+            for cell, _ in column:
+                # changes anywhere in the column reset the totals
+                self.dep_graph.add_edge(cell_range, cell)
+                self.column_totals[cell.address.address] = totals
+            totaled.append(address)
+
+        self.log.info("Totaled %s cells in %s columns" % (
+            len(self.column_totals), len(totaled)))
+        return totaled
+
     def validate_calcs(self, output_addrs=None):
         """For each address, calc the value, and verify that it matches
 
@@ -485,7 +750,8 @@ class ExcelCompiler:
             try:
                 self._gen_graph(addr)
                 cell = self.cell_map[addr.address]
-                if isinstance(cell, _Cell) and cell.python_code:
+                if isinstance(cell, _Cell) and cell.python_code and \
+                        cell.sheet != CSE_SHEET:
                     original_value = cell.value
                     if original_value == str(cell.formula):
                         self.log.debug(
@@ -624,17 +890,42 @@ class ExcelCompiler:
 
         if cell_range.value is None:
             self.log.debug("Evaluating: {}".format(cell_range.address))
-            addresses = cell_range.addresses
+            rows = self._range_rows.rows(cell_range.addresses[0])
 
-            data = tuple(
-                tuple(self._evaluate(addr.address) for addr in row)
-                for row in addresses
-            )
+            if self._is_constant_range(cell_range):
+                # no formulas to evaluate, the cells have their values
+                cell_map = self.cell_map
+
+                def evaluate(address):
+                    return cell_map[address].value
+            else:
+                evaluate = self._evaluate
+
+            def row_value(row_addresses):
+                row = row_addresses[0].row
+                value = rows.get(row)
+                if value is None:
+                    value = rows[row] = tuple(
+                        evaluate(addr.address) for addr in row_addresses)
+                return value
 
-            cell_range.value = data
+            cell_range.value = RangeValue(map(row_value, cell_range.addresses))
 
         return cell_range.value
 
+    def _is_constant_range(self, cell_range):
+        """ Are all of the cells of the range constants, (no formulas)
+
+        The value of such a range only changes when one of its cells is set.
+        So the value, and the data built from it (lookup indices, criteria
+        columns), are kept by recalculate().
+        """
+        if cell_range.constant is None:
+            cells = [self.cell_map.get(addr.address) for addr in cell_range]
+            cell_range.constant = all(
+                isinstance(cell, _Cell) and not cell.formula for cell in cells)
+        return cell_range.constant
+
     def _evaluate(self, address):
         """Evaluate a single cell"""
         cell = self.cell_map[address]
@@ -645,15 +936,16 @@ class ExcelCompiler:
                 self._evaluate_range(cell.address.address)
 
             elif cell.python_code:
-                self.log.debug(
-                    "Evaluating: {}, {}".format(cell.address, cell.python_code))
-                if self.eval is None:
-                    self.eval = ExcelFormula.build_eval_context(
-                        self._evaluate, self._evaluate_range, self.log)
-                value = self.eval(cell.formula)
-                self.log.info("Cell %s evaluated to '%s' (%s)" % (
-                    cell.address, value, type(value).__name__))
-                cell.value = VALUE_ERROR if list_like(value) else value
+                run = self.vector_runs.get(cell.address.address)
+                if run is not None and not run.evaluating:
+                    self._evaluate_vector_run(run)
+
+                totals = self.column_totals.get(address)
+                if totals is not None and not totals.evaluating:
+                    cell.value = self._evaluate_column_totals(totals, address)
+
+                if cell.value is None:
+                    self._evaluate_formula(cell)
 
         if isinstance(cell.value, AddressRange):
             # If the cell returns a reference, then dereference
@@ -661,6 +953,84 @@ class ExcelCompiler:
 
         return cell.value
 
+    def _evaluate_formula(self, cell):
+        """Evaluate the formula of a single cell"""
+        self.log.debug(
+            "Evaluating: {}, {}".format(cell.address, cell.python_code))
+        value = self._eval_context()(cell.formula)
+        self.log.info("Cell %s evaluated to '%s' (%s)" % (
+            cell.address, value, type(value).__name__))
+        cell.value = VALUE_ERROR if list_like(value) else value
+
+    def _eval_context(self):
+        """The function which evaluates formulas, built on first use"""
+        if self.eval is None:
+            self.eval = ExcelFormula.build_eval_context(
+                self._evaluate_reference,
+                self._evaluate_range_reference,
+                self.log,
+                resolve_reference=self._reference,
+            )
+
+            # compiling the known formulas together is much faster
+            self.eval.load_functions(
+                a_cell.formula for a_cell in self.cell_map.values()
+                if isinstance(a_cell, _Cell) and a_cell.formula)
+        return self.eval
+
+    def _evaluate_vector_run(self, run):
+        """Evaluate the unevaluated cells of a run together"""
+        cells = [cell for cell in run.cells if cell.value is None]
+        self.log.debug("Evaluating: {} cells of {}".format(len(cells), run))
+
+        # reentered if the inputs depend on the run, so evaluate those alone
+        run.evaluating = True
+        try:
+            inputs = [tuple(self._evaluate(address)
+                            for address in run.references[cell])
+                      for cell in cells]
+        finally:
+            run.evaluating = False
+
+        for cell, value in zip(cells, run.evaluate(inputs)):
+            if cell.value is None:
+                if value is None:
+                    self._evaluate_formula(cell)
+                else:
+                    cell.value = value
+
+    def _evaluate_column_totals(self, totals, address):
+        """The total for a cell from the prefix sums of its column"""
+        # reentered if the column depends on its totals, evaluate those alone
+        totals.evaluating = True
+        try:
+            value = self._evaluate_range(totals.address.address)
+        finally:
+            totals.evaluating = False
+        return totals.evaluate(value, address)
+
+    def _reference(self, address):
+        """ The cell or range which a compiled formula will be bound to """
+        cell = self.cell_map.get(address)
+        if cell is None:
+            # not built yet, so always evaluate via the address
+            cell = _UnbuiltReference(AddressRange(address), None)
+        return cell
+
+    def _evaluate_reference(self, cell):
+        """ Evaluate a bound cell, fast path when already evaluated """
+        value = cell.value
+        if value is None or isinstance(value, AddressRange):
+            return self._evaluate(cell.address.address)
+        return value
+
+    def _evaluate_range_reference(self, cell_range):
+        """ Evaluate a bound range, fast path when already evaluated """
+        value = cell_range.value
+        if value is None or isinstance(value, AddressRange):
+            return self._evaluate_range(cell_range.address.address)
+        return value
+
     def evaluate(self, address):
         """ evaluate a cell or cells in the spreadsheet
 
@@ -749,11 +1119,322 @@ class ExcelCompiler:
         )
 
 
+def _pure_call_spans(python_code, functions, include_root=True):
+    """ Find the calls to `functions` which depend only on cell references
+
+    :param python_code: python code of a formula
+    :param functions: names of functions whose results depend only on
+        their arguments
+    :param include_root: include the call if it is the entire expression
+    :return: list of (start, end) offsets of the calls, outer calls first
+    """
+    if '\n' in python_code.strip():
+        return []
+
+    try:
+        tree = ast.parse(python_code, mode='eval')
+        tokens = tuple(tokenize.generate_tokens(
+            io.StringIO(python_code).readline))
+    except (SyntaxError, tokenize.TokenError):
+        return []
+
+    # the offset of the closing paren for each opening paren
+    closing = {}
+    opened = []
+    for token in tokens:
+        if token.type == tokenize.OP and token.string in '()':
+            if token.string == '(':
+                opened.append(token.start[1])
+            else:
+                closing[opened.pop()] = token.end[1]
+
+    # ast offsets are into the utf8 encoded code
+    encoded = python_code.encode('utf8')
+    allowed_names = frozenset(functions) | {'_C_', '_R_', 'ExcelError'}
+    spans = []
+
+    def visit(node):
+        if isinstance(node, ast.Call) and \
+                isinstance(node.func, ast.Name) and \
+                node.func.id in functions and \
+                (include_root or node is not tree.body):
+            names = {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+            if names <= allowed_names and names & {'_C_', '_R_'}:
+                start = len(encoded[:node.col_offset].decode('utf8'))
+                paren = python_code.index('(', start + len(node.func.id))
+                spans.append((start, closing[paren]))
+
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+
+    visit(tree.body)
+    return spans
+
+
+class _VectorRun:
+    """ Cells in a column with the same arithmetic formula, which are
+    evaluated together with numpy.
+    """
+
+    # integers smaller than this, are exact as floats, even after an add
+    limit = 2 ** 52
+
+    operators = {
+        ast.Add: np.add,
+        ast.Sub: np.subtract,
+        ast.Mult: np.multiply,
+        ast.Div: np.true_divide,
+    }
+
+    def __init__(self, template, cells, references):
+        self.template = template
+        self.cells = cells
+        self.references = references
+        self.evaluating = False
+
+    def __repr__(self):
+        return str(self.address)
+
+    @property
+    def address(self):
+        first, last = self.cells[0].address, self.cells[-1].address
+        return AddressRange(
+            (first.col_idx, first.row, last.col_idx, last.row),
+            sheet=first.sheet)
+
+    @classmethod
+    def parse(cls, python_code):
+        """ Replace the cell references with names, for simple arithmetic
+
+        :param python_code: python code of a formula
+        :return: the template and the referenced addresses, or None if the
+            code has anything other than cell references, numbers and
+            arithmetic operators
+        """
+        references = []
+        for func, address in EVAL_REGEX.findall(python_code):
+            if func != '_C_':
+                return None
+            references.append(address[2:-2])
+
+        names = iter(range(len(references)))
+        template = EVAL_REGEX.sub(
+            lambda m: '_v{}_'.format(next(names)), python_code)
+        try:
+            tree = ast.parse(template, mode='eval')
+        except SyntaxError:
+            return None
+
+        allowed = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.USub,
+                   ast.Num, ast.Name, ast.Load) + tuple(cls.operators)
+        for node in ast.walk(tree):
+            if not isinstance(node, allowed) or \
+                    isinstance(node, ast.Name) and \
+                    not re.match(r'_v\d+_$', node.id) or \
+                    isinstance(node, ast.Num) and not (
+                        type(node.n) in (int, float) and
+                        abs(node.n) < cls.limit):
+                return None
+
+        if not references or isinstance(tree.body, (ast.Name, ast.Num)):
+            return None
+        return template, tuple(references)
+
+    def evaluate(self, inputs):
+        """ Evaluate the template for rows of input values
+
+        The results are the same as the excel operators give for numbers.
+
+        :param inputs: for each row, the values of the referenced cells
+        :return: for each row, the value, or None if the row needs to be
+            evaluated by its formula (anything other than numbers as inputs,
+            division by zero, or numbers too large to be exact as floats)
+        """
+        limit = self.limit
+        ok = np.array([
+            all(type(v) in (int, float) and -limit < v < limit for v in row)
+            for row in inputs], dtype=bool)
+        num_refs = len(self.references[self.cells[0]])
+        values = np.array(
+            [row if row_ok else (0,) * num_refs
+             for row, row_ok in zip(inputs, ok)],
+            dtype=float).reshape(len(inputs), num_refs)
+
+        def children(node):
+            if isinstance(node, ast.UnaryOp):
+                return node.operand,
+            return node.left, node.right
+
+        def apply(node, operands):
+            # python operators see integer valued floats as ints, so no -0.0
+            operands = [operand + 0.0 for operand in operands]
+            if isinstance(node, ast.UnaryOp):
+                value = -operands[0]
+            else:
+                left, right = operands
+                if isinstance(node.op, ast.Div):
+                    np.logical_and(ok, right != 0, out=ok)
+                    right = np.where(right == 0, 1.0, right)
+                value = self.operators[type(node.op)](left, right)
+            np.logical_and(ok, np.abs(value) < limit, out=ok)
+            return value
+
+        def visit(node):
+            if isinstance(node, ast.Name):
+                return values[:, int(node.id[2:-1])]
+            elif isinstance(node, ast.Num):
+                return np.full(len(inputs), float(node.n))
+            return apply(node, [visit(child) for child in children(node)])
+
+        root = ast.parse(self.template, mode='eval').body
+        with np.errstate(all='ignore'):
+            operands = [visit(child) for child in children(root)]
+            result = apply(root, operands)
+
+        # the result is an int if the operands were integer valued
+        is_int = np.full(len(inputs), not isinstance(
+            getattr(root, 'op', None), ast.Div))
+        for operand in operands:
+            np.logical_and(is_int, np.floor(operand) == operand, out=is_int)
+
+        return [
+            (int(value) if value_is_int else value) if row_ok else None
+            for value, row_ok, value_is_int in zip(
+                result.tolist(), ok.tolist(), is_int.tolist())
+        ]
+
+
+class _ColumnTotals:
+    """ SUMs, COUNTs and AVERAGEs of ranges in a column, from prefix sums
+    of a range covering all of them
+    """
+
+    regex = re.compile(r'^(xsum|count|average)\(_R_\("([^"]+)"\)\)$')
+
+    def __init__(self, cell_range, cells):
+        self.cell_range = cell_range
+        # cell address -> (function, start, stop) of the rows in the column
+        self.cells = cells
+        self.value = None
+        self.evaluating = False
+
+    def __repr__(self):
+        return str(self.address)
+
+    @property
+    def address(self):
+        return self.cell_range.address
+
+    @classmethod
+    def parse(cls, python_code):
+        """ The function and the range, for a total of one column
+
+        :param python_code: python code of a formula
+        :return: the function name and the `AddressRange`, or None if the
+            code is anything other than a total of a bounded column range
+        """
+        match = cls.regex.match(python_code)
+        if match is None:
+            return None
+        address = AddressRange(match.group(2))
+        if not address.is_range or address.size.width != 1 or \
+                not address.is_bounded_range:
+            return None
+        return match.group(1), address
+
+    def _build(self, value):
+        """ Cumulative sums and counts of the column's values """
+        column = CriteriaColumn(value)
+        reals = column.is_real & ~column.is_bool
+        numbers = np.where(reals, column.numbers, 0)
+
+        def prefix(values):
+            return np.concatenate(((0, ), np.cumsum(values)))
+
+        self.value = value
+        self.values = column.values
+        self.errors = np.flatnonzero(column.is_error)
+        self.exact = column.exact and bool(np.all(np.isfinite(numbers))) and \
+            np.abs(numbers).sum() < column.limit
+        self.sums = prefix(numbers)
+        self.reals = prefix(reals)
+        self.floats = prefix(reals & ~column.is_int)
+        self.counts = prefix(reals)
+
+    def evaluate(self, value, address):
+        """ The total for the cell
+
+        :param value: the value of the range covering the column
+        :param address: the address of the cell
+        :return: the total, or None if the formula needs to be evaluated
+        """
+        if value is not self.value:
+            self._build(value)
+        func, start, stop = self.cells[address]
+
+        if func == 'count':
+            return int(self.counts[stop] - self.counts[start])
+
+        error = np.searchsorted(self.errors, start)
+        if error < len(self.errors) and self.errors[error] < stop:
+            return self.values[self.errors[error]]
+        if not self.exact or self.floats[stop] - self.floats[start]:
+            # differences of float prefix sums lose the small values of the
+            # window to cancellation, (1e15 and then 0.1s), so only windows
+            # of all ints are exact
+            return None
+
+        total = int(self.sums[stop] - self.sums[start])
+        if func == 'xsum':
+            return total
+
+        count = int(self.reals[stop] - self.reals[start])
+        return total / count if count else DIV0
+
+
+class _RangeRows:
+    """ The values of the rows of evaluated ranges
+
+    Ranges with the same columns share the tuples of their rows, so the
+    value of a range which overlaps one already evaluated (A1:A100 and
+    A2:A101) is mostly a gather of existing rows, and not of each cell.
+    A row is dropped when one of its cells is reset.
+    """
+
+    def __init__(self):
+        # sheet -> (min_col, max_col) -> row -> tuple of the row's values
+        self._spans = collections.defaultdict(dict)
+
+    def rows(self, row_addresses):
+        """ The row values for the columns of a row of a range
+
+        :param row_addresses: the `AddressCell`s of a row of the range
+        :return: dict of row number to the row's values, to be updated
+        """
+        start, end = row_addresses[0], row_addresses[-1]
+        return self._spans[start.sheet].setdefault(
+            (start.col_idx, end.col_idx), {})
+
+    def reset(self, address):
+        """ Drop the rows which have the cell """
+        col, row = address.col_idx, address.row
+        for (min_col, max_col), rows in self._spans.get(
+                address.sheet, {}).items():
+            if min_col <= col <= max_col:
+                rows.pop(row, None)
+
+    def clear(self):
+        self._spans.clear()
+
+
 class _CellRange:
     # TODO: only supports rectangular ranges
 
     serialize = False
 
+    # are all of the cells constants, None until checked
+    constant = None
+
     def __init__(self, data):
         self.address = AddressRange(data.address)
         if not self.address.sheet:
@@ -774,7 +1455,7 @@ class _CellRange:
     __str__ = __repr__
 
     def __iter__(self):
-        return flatten(self.addresses)
+        return itertools.chain.from_iterable(self.addresses)
 
     @property
     def needed_addresses(self):
@@ -870,4 +1551,5 @@ class _CompiledImporter:
             return ExcelOpxWrapper.RangeData(address, cell_value, None)
 
         else:
-            return ExcelOpxWrapper.RangeData(address, '', cell_value)
+            return ExcelOpxWrapper.RangeData(
+                address, '', as_error(cell_value))
@@ -13,14 +13,17 @@ from pycel.excelutil import (
     build_operator_operand_fixup,
     coerce_to_number,
     EMPTY,
-    ERROR_CODES,
+    ExcelError,
     get_linest_degree,
+    is_error,
     math_wrap,
+    MemoizedFunction,
     NAME_ERROR,
     PyCelException,
     uniqueify,
 )
 from pycel.lib.function_info import func_status_msg
+from pycel.lib.function_traits import function_traits
 
 
 EVAL_REGEX = re.compile(r'(_C_|_R_)(\([^)]*\))')
@@ -253,7 +256,8 @@ class OperatorNode(ASTNode):
         # don't render the ^{1,2,..} part in a linest formula
         # TODO: bit of a hack
         if op == "**":
-            if parent and parent.value.lower() == "linest(":
+            if parent and parent.value.lower() == "linest(" and \
+                    not parent.is_array_linest:
                 return args[0].emit
 
         if op == '%':
@@ -278,7 +282,10 @@ class OperandNode(ASTNode):
         if self.subtype == self.token.LOGICAL:
             return str(self.value.lower() == "true")
 
-        elif self.subtype in ("TEXT", "ERROR") and len(self.value) > 2:
+        elif self.subtype == "ERROR":
+            return 'ExcelError("{}")'.format(self.value)
+
+        elif self.subtype == "TEXT" and len(self.value) > 2:
             # if the string contains quotes, escape them
             return '"{}"'.format(self.value.replace('""', '\\"').strip('"'))
 
@@ -307,7 +314,7 @@ class RangeNode(OperandNode):
                     table_name = excel.table_name_containing(self.cell.address)
 
             if not table_name:
-                return '"{}"'.format(NAME_ERROR)
+                return 'ExcelError("{}")'.format(NAME_ERROR)
 
             addr_str = '{}{}'.format(table_name, addr_str)
             address = AddressRange.create(
@@ -338,6 +345,7 @@ class FunctionNode(ASTNode):
     func_map = {
         "and": "x_and",
         "atan2": "xatan2",
+        "forecast_linear": "forecast",
         "gammaln": "lgamma",
         "if": "x_if",
         "len": "xlen",
@@ -408,8 +416,20 @@ class FunctionNode(ASTNode):
         # simply create a list
         return self.comma_join_emit()
 
+    @property
+    def is_array_linest(self):
+        """ linest inside of an index(), as an expanded array formula
+
+        The full linest array is returned, and each cell indexes it
+        """
+        parent = self.parent
+        return bool(parent and parent.value.lower() == 'index(')
+
     def func_linest(self):
         func = self.value.lower().strip('(')
+        if func == 'linest' and self.is_array_linest:
+            return '{}({})'.format(func, self.comma_join_emit())
+
         code = '{}({}'.format(func, self.comma_join_emit())
 
         if not self.cell or not self.cell.excel:
@@ -562,14 +582,24 @@ class ExcelFormula:
                 self._python_code = self.ast.emit
         return self._python_code
 
+    @python_code.setter
+    def python_code(self, value):
+        """Replace the python code, and discard anything built from it"""
+        self._python_code = value
+        self._needed_addresses = None
+        self._compiled_python = None
+        self._marshalled_python = None
+        self.compiled_lambda = None
+
     @property
     def compiled_python(self):
         """ Using the Python code, generate compiled python code"""
         if self._compiled_python is None and self.python_code:
             if self._marshalled_python is not None:
                 try:
-                    marshalled, names = self._marshalled_python
-                    self._compiled_python = marshal.loads(marshalled), names
+                    marshalled, names, refs = self._marshalled_python
+                    self._compiled_python = (
+                        marshal.loads(marshalled), names, refs)
                 except Exception:
                     self._marshalled_python = None
                     return self.compiled_python
@@ -768,7 +798,8 @@ class ExcelFormula:
         return stack[0]
 
     @classmethod
-    def build_eval_context(cls, evaluate, evaluate_range, logger=None):
+    def build_eval_context(cls, evaluate, evaluate_range, logger=None,
+                           resolve_reference=None):
         """eval with namespace management.  Will auto import needed functions
 
         Used like:
@@ -778,6 +809,9 @@ class ExcelFormula:
         :param evaluate: a function to evaluate a cell address
         :param evaluate_range: a function to evaluate a range address
         :param logger: a looger to use (defaults to pycel)
+        :param resolve_reference: a function which is given each address
+            once when the formula is loaded.  What it returns is passed to
+            `evaluate` and `evaluate_range`, (defaults to the address)
         :return: a function to evaluate a compiled expression from build_ast
         """
 
@@ -791,6 +825,7 @@ class ExcelFormula:
         )
 
         logger = logger or logging.getLogger('pycel')
+        resolve_reference = resolve_reference or (lambda address: address)
         error_messages = []
 
         def capture_error_state(is_exception, msg):
@@ -821,62 +856,113 @@ class ExcelFormula:
                 raise exc(error_msg)
             return error_msg
 
-        def load_function(excel_formula, name_space):
-            """exec the code into our address space"""
-
-            # the compiled expressions can call these functions if
-            # referencing other cells or a range of cells
-            name_space['_C_'] = evaluate
-            name_space['_R_'] = evaluate_range
-            name_space['_REF_'] = AddressRange.create
-            name_space['pi'] = math.pi
+        # the compiled expressions can call these functions if
+        # referencing other cells or a range of cells
+        name_space = dict(
+            _C_=evaluate,
+            _R_=evaluate_range,
+            _REF_=AddressRange.create,
+            ExcelError=ExcelError,
+            pi=math.pi,
+        )
 
-            for name in ('int', 'abs', 'round'):
-                name_space[name] = math_wrap(
-                    globals()['__builtins__'][name])
+        for name in ('int', 'abs', 'round'):
+            name_space[name] = math_wrap(globals()['__builtins__'][name])
 
-            # function to fixup the operands
-            name_space['excel_operator_operand_fixup'] = \
-                build_operator_operand_fixup(capture_error_state)
+        # function to fixup the operands
+        name_space['excel_operator_operand_fixup'] = \
+            build_operator_operand_fixup(capture_error_state)
 
-            # hook for the execed code to save the resulting lambda
-            name_space['lambdas'] = lambdas = []
+        # names which are not in any of the modules
+        not_found = set()
 
-            # get the compiled code and needed names
-            compiled, names = excel_formula.compiled_python
+        def load_names(names):
+            """ import the needed names into the shared name space
 
-            # load the needed names
-            not_found = set()
+            :return: the names which could not be found
+            """
             for name in names:
-                if name not in name_space:
+                if name not in name_space and name not in not_found:
                     funcs = ((getattr(module, name, None), module)
                              for module in modules)
                     func, module = next(
                         (f for f in funcs if f[0] is not None), (None, None))
                     if func is None:
                         not_found.add(name)
+                    elif module.__name__ == 'math':
+                        name_space[name] = math_wrap(func)
                     else:
-                        if module.__name__ == 'math':
-                            name_space[name] = math_wrap(func)
-                        else:
-                            name_space[name] = func
+                        name_space[name] = func
+
+            return not_found.intersection(names)
 
-            # exec the code to define the lambda
-            exec(compiled, name_space, name_space)
-            excel_formula.compiled_lambda = lambdas[0]
-            del name_space['lambdas']
-            return not_found
+        def set_missing_msg(excel_formula, missing):
+            if missing:
+                msg_fmt = 'Function {} has not been implemented. '
+                excel_formula.msg = '\n'.join(
+                    msg_fmt.format(f.upper()) +
+                    func_status_msg(f)[1] for f in sorted(missing))
+
+        def exec_lambdas(compiled):
+            """ exec the code, and return the lambdas it defined """
+            # hook for the execed code to save the resulting lambdas
+            name_space['lambdas'] = lambdas = []
+            try:
+                exec(compiled, name_space, name_space)
+            finally:
+                del name_space['lambdas']
+            return lambdas
+
+        def load_function(excel_formula):
+            """exec the code into our address space"""
+
+            # get the compiled code, needed names and referenced addresses
+            compiled, names, refs = excel_formula.compiled_python
+            set_missing_msg(excel_formula, load_names(names))
+            excel_formula.compiled_lambda = exec_lambdas(compiled)[0](
+                *(resolve_reference(ref) for ref in refs))
+
+        def load_functions(excel_formulas):
+            """ Compile and load many formulas with one exec per file
+
+            Formulas which can not be compiled are skipped, and will report
+            their errors if they are evaluated.
+
+            :param excel_formulas: iterable of ExcelFormula
+            """
+            by_filename = {}
+            for excel_formula in excel_formulas:
+                if excel_formula.compiled_lambda is None and \
+                        excel_formula._marshalled_python is None and \
+                        excel_formula.python_code:
+                    try:
+                        tree, names, refs = excel_formula._build_python_ast()
+                    except Exception:
+                        continue
+                    by_filename.setdefault(
+                        excel_formula.filename or __file__, []).append(
+                        (excel_formula, tree, names, refs))
+
+            for filename, to_load in by_filename.items():
+                module = ast.parse('', mode='exec')
+                module.body = [stmt for _, tree, _, _ in to_load
+                               for stmt in tree.body]
+                try:
+                    compiled = compile(module, filename, mode='exec')
+                except Exception:  # pragma: no cover
+                    continue
+
+                for (excel_formula, _, names, refs), binder in zip(
+                        to_load, exec_lambdas(compiled)):
+                    set_missing_msg(excel_formula, load_names(names))
+                    excel_formula.compiled_lambda = binder(
+                        *(resolve_reference(ref) for ref in refs))
 
         def eval_func(excel_formula):
             """ Call the compiled lambda to evaluate the cell """
 
             if excel_formula.compiled_lambda is None:
-                missing = load_function(excel_formula, locals())
-                if missing:
-                    msg_fmt = 'Function {} has not been implemented. '
-                    excel_formula.msg = '\n'.join(
-                        msg_fmt.format(f.upper()) +
-                        func_status_msg(f)[1] for f in sorted(missing))
+                load_function(excel_formula)
 
             try:
                 ret_val = excel_formula.compiled_lambda()
@@ -890,15 +976,51 @@ class ExcelFormula:
                              exc=FormulaEvalError)
 
             if error_messages:
-                level = 'warning' if ret_val in ERROR_CODES else 'info'
+                level = 'warning' if is_error(ret_val) else 'info'
                 error_logger(level, excel_formula.python_code)
 
             return ret_val if ret_val not in (None, EMPTY) else 0
 
+        def memoize(names, maxsize=1024):
+            """ Cache the results of calls to these functions
+
+            Functions which are not pure, or which have lazy arguments, are
+            not memoized.
+
+            :param names: the python function names
+            :param maxsize: the size of the cache for each function
+            :return: dict of name to its `MemoizedFunction`
+            """
+            load_names(names)
+            memoized = {}
+            for name in names:
+                traits = function_traits(name)
+                func = name_space.get(name)
+                if func is not None and traits.pure and traits.lazy is None:
+                    if not isinstance(func, MemoizedFunction):
+                        # loaded lambdas find the functions in the name space
+                        func = name_space[name] = MemoizedFunction(
+                            func, maxsize=maxsize)
+                    memoized[name] = func
+            return memoized
+
+        eval_func.load_functions = load_functions
+        eval_func.memoize = memoize
         return eval_func
 
     def _compile_python_ast(self):
-        """ Compile the python code into a lambda for execution
+        """ Compile the python code into a lambda for execution """
+        tree, names, refs = self._build_python_ast()
+        kwargs = dict(mode='exec', filename=self.filename or __file__)
+        self._compiled_python = compile(tree, **kwargs), names, refs
+        self._marshalled_python = (
+            marshal.dumps(self._compiled_python[0]), names, refs)
+
+    def _build_python_ast(self):
+        """ Build the ast which defines the lambda for execution
+
+        The cell and range addresses are replaced with the arguments of an
+        enclosing lambda, so they can be bound once when the code is loaded
 
         ### Traceback will show this line if not loaded from a text file
 
@@ -908,12 +1030,14 @@ class ExcelFormula:
         local_line = sys._getframe().f_lineno - 6
 
         source_code = "lambdas.append(lambda: {})".format(self.python_code)
-        kwargs = dict(mode='exec', filename=self.filename or __file__)
-        tree = ast.parse(source_code, **kwargs)
+        tree = ast.parse(source_code, filename=self.filename or __file__)
         ast.increment_lineno(tree, (self.lineno - 1) or local_line)
 
         names = set()
 
+        # address -> argument name of the enclosing lambda
+        references = {}
+
         # edit the ast with a few changes to be more excel like
 
         class OperatorWrapper(ast.NodeTransformer):
@@ -936,6 +1060,39 @@ class ExcelFormula:
                 node = ast.NodeTransformer.generic_visit(self, node)
                 return self.replace_op(node, node.left, node.op, node.right)
 
+            def visit_Call(self, node):
+                """ bind references, wrap lazy arguments in a lambda """
+                node = ast.NodeTransformer.generic_visit(self, node)
+                if getattr(node.func, 'id', None) in ('_C_', '_R_') and \
+                        len(node.args) == 1 and \
+                        isinstance(node.args[0], ast.Str):
+                    node.args[0] = self.reference(node.args[0])
+                # Arguments which are only evaluated if needed are passed
+                # to the function as thunks, resolved in the function.
+                first_lazy = function_traits(
+                    getattr(node.func, 'id', None)).lazy
+                if first_lazy is not None:
+                    node.args[first_lazy:] = [
+                        self.thunk(arg) for arg in node.args[first_lazy:]]
+                return node
+
+            @staticmethod
+            def reference(node):
+                """ replace the address with an argument to be bound """
+                if node.s not in references:
+                    references[node.s] = '_a{}_'.format(len(references))
+                return ast.copy_location(
+                    ast.Name(id=references[node.s], ctx=ast.Load()), node)
+
+            @staticmethod
+            def thunk(node):
+                """ defer evaluation of the node, if it calls anything """
+                if not any(isinstance(n, ast.Call) for n in ast.walk(node)):
+                    return node
+                lambda_node = ast.parse('lambda: None', mode='eval').body
+                lambda_node.body = node
+                return ast.copy_location(lambda_node, node)
+
             def visit_UnaryOp(self, node):
                 """ change the UnaryOp node to a function node """
                 node = ast.NodeTransformer.generic_visit(self, node)
@@ -956,8 +1113,13 @@ class ExcelFormula:
                 )
 
         # modify the ast tree to convert Compare and BinOp to Call
-        tree = ast.fix_missing_locations(OperatorWrapper().visit(tree))
+        tree = OperatorWrapper().visit(tree)
+
+        # define a lambda which binds the references, and returns the lambda
+        append_call = tree.body[0].value
+        binder = ast.parse('lambda {}: None'.format(
+            ', '.join(references.values())), mode='eval').body
+        binder.body = append_call.args[0]
+        append_call.args[0] = ast.copy_location(binder, binder.body)
 
-        # compile the tree
-        self._compiled_python = compile(tree, **kwargs), names
-        self._marshalled_python = marshal.dumps(self._compiled_python[0]), names
+        return ast.fix_missing_locations(tree), names, tuple(references)
@@ -1,10 +1,9 @@
 """
 Python equivalents of various excel functions
 """
-import itertools as it
 
-from bisect import bisect_right
-from collections import Counter
+import collections
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP, ROUND_UP
 from math import atan2, log
@@ -14,13 +13,15 @@ from pycel.excelutil import (
     assert_list_like,
     build_wildcard_re,
     coerce_to_number,
+    CriteriaColumn,
+    CriteriaGroups,
     coerce_to_string,
     date_from_int,
     DIV0,
-    ERROR_CODES,
     ExcelCmp,
-    find_corresponding_index,
+    flat_values,
     flatten,
+    is_error,
     is_leap_year,
     is_number,
     list_like,
@@ -29,15 +30,109 @@ from pycel.excelutil import (
     MAX_ROW,
     NA_ERROR,
     normalize_year,
+    NUM_ERROR,
     PyCelException,
+    RangeCache,
+    REF_ERROR,
+    resolve_thunk,
     VALUE_ERROR,
 )
 
+# lookup data derived from (immutable) range values, for large ranges only
+lookup_cache = RangeCache()
+LOOKUP_CACHE_MIN_SIZE = 16
+
+
+def _lookup_column(table_array, col_idx=0):
+    """ A column of a 2D range, cached for large ranges """
+    if not isinstance(table_array, tuple) or \
+            len(table_array) < LOOKUP_CACHE_MIN_SIZE:
+        return tuple(row[col_idx] for row in table_array)
+    return lookup_cache.get(
+        table_array, ('column', col_idx),
+        lambda value: tuple(row[col_idx] for row in value))
+
+
+def _exact_match_index(lookup_array):
+    """ Map the comparison key of each value to its first position """
+    index = {}
+    for i, value in enumerate(lookup_array, 1):
+        if not is_error(value):
+            index.setdefault(ExcelCmp(value)[:2], i)
+    return index
+
+
+def _is_large_range(value):
+    """ Is this a range value large enough to cache data derived from it """
+    if not isinstance(value, tuple) or not value:
+        return False
+    size = len(value)
+    if isinstance(value[0], tuple):
+        size *= len(value[0])
+    return size >= LOOKUP_CACHE_MIN_SIZE
+
+
+def _criteria_column(values):
+    """ Criteria columns, cached for large ranges """
+    if _is_large_range(values):
+        return lookup_cache.get(values, 'criteria', CriteriaColumn)
+    return CriteriaColumn(values)
+
+
+def _criteria_rows(args):
+    """ Indices of the rows which meet every (range, criteria) pair """
+    assert len(args) and len(args) % 2 == 0, \
+        'Must have paired criteria and ranges'
+
+    ranges, criterias = args[0::2], args[1::2]
+    columns = [_criteria_column(rng) for rng in ranges]
+
+    if all(map(_is_large_range, ranges)):
+        # repeated equality criteria over the same ranges use a group index
+        groups = lookup_cache.get(
+            ranges[0], ('groups', ) + tuple(map(id, ranges[1:])),
+            lambda value: CriteriaGroups(ranges, columns))
+        rows = groups.select(criterias)
+        if rows is not None:
+            return rows
+
+    masks = [column.mask(criteria)
+             for column, criteria in zip(columns, criterias)]
+    size = min(len(mask) for mask in masks)
+    mask = masks[0][:size]
+    for other in masks[1:]:
+        mask = mask & other[:size]
+    return np.flatnonzero(mask)
+
+
+def _approximate_match_keys(lookup_array):
+    """ Comparison keys, (None for empty), and the positions of each type """
+    keys = []
+    positions = {}
+    for i, value in enumerate(lookup_array):
+        key = None if value is None else ExcelCmp(value)[:2]
+        keys.append(key)
+        positions.setdefault(0 if key is None else key[0], []).append(i)
+    return tuple(keys), None in keys, positions
+
+
+def _bisect_right_empty(keys, key, empty_key):
+    """ bisect_right() where the empty (None) keys compare as `empty_key` """
+    lo, hi = 0, len(keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        mid_key = keys[mid]
+        if key < (empty_key if mid_key is None else mid_key):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
 
 def _numerics(*args, no_bools=False):
     # ignore non numeric cells
     args = tuple(flatten(args, lambda x: coerce_to_number(x, raise_div0=False)))
-    error = next((x for x in args if x in ERROR_CODES), None)
+    error = next((x for x in args if is_error(x)), None)
     if error is not None:
         # return the first error in the list
         return error
@@ -47,20 +142,293 @@ def _numerics(*args, no_bools=False):
         return tuple(x for x in args if isinstance(x, (int, float)))
 
 
+def _numeric_parts(*args, no_bools=False):
+    """ _numerics(), but with large ranges as cached numpy columns
+
+    :return: the first error, else a tuple of the numerics from the other
+        arguments, and a list of (column, rows, position) for the large
+        ranges, where position is the number of numerics before the range
+    """
+    numerics = []
+    columns = []
+    for arg in args:
+        if _is_large_range(arg):
+            column = _criteria_column(arg)
+            data = column.reals(no_bools=no_bools)
+            if not isinstance(data, str) and len(data):
+                columns.append((column, data, len(numerics)))
+        else:
+            data = _numerics(arg, no_bools=no_bools)
+            if not isinstance(data, str):
+                numerics.extend(data)
+
+        # A returned string is an error code
+        if isinstance(data, str):
+            return data
+
+    return tuple(numerics), columns
+
+
+def _sum_parts(numerics, columns):
+    """ Sum of the _numeric_parts(), added in the order of the arguments,
+    so floats round the same as python's sum() of the plain numerics
+    """
+    total = position = 0
+    for column, rows, stop in columns:
+        total = column.sum(rows, start=sum(numerics[position:stop], total))
+        position = stop
+    return sum(numerics[position:], total)
+
+
+def _rows(array):
+    """ A range as a tuple of rows, a scalar as a 1x1 array """
+    if not list_like(array):
+        return ((array, ), )
+    if isinstance(array, tuple) and array and isinstance(array[0], tuple):
+        # range values keep their identity, for the caches
+        return array
+    array = tuple(array)
+    if array and not list_like(array[0]):
+        # a one dimensional array is a single row
+        return (array, )
+    return tuple(map(tuple, array))
+
+
+def _numeric_matrix(array, strict=False):
+    """ The numbers of a 2D range as a float array
+
+    :param array: tuple of rows, as from `_rows`
+    :param strict: if True, a value which is not a number is a #VALUE!,
+        else text, booleans and empty cells are zero
+    :return: the first error, else a tuple of the numbers and whether the
+        numbers are all ints
+    """
+    column = _criteria_column(array)
+    errors = np.flatnonzero(column.is_error)
+    if len(errors):
+        return column.values[errors[0]]
+
+    numbers = column.is_real & ~column.is_bool
+    if strict and not np.all(numbers):
+        return VALUE_ERROR
+
+    matrix = np.where(numbers, column.numbers, 0.0).reshape(
+        len(array), len(array[0]) if array else 0)
+    return matrix, bool(np.all(column.is_int[numbers]))
+
+
+# coefs: (m1, m2, ..., b), in the order of the columns of the fit
+# result: the LINEST array, with the coefficients and statistics
+# by_rows: the x variables are rows, (known_ys is a row)
+# xs: the known_xs as a float array
+LinearFit = collections.namedtuple('LinearFit', 'coefs result by_rows xs')
+
+
+def _logical_arg(value, default):
+    """ An optional logical argument, which can also be 'TRUE' or 'FALSE' """
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+def _linear_fit(known_ys, known_xs, const, degree=1, log_ys=False):
+    """ Least squares fit for LINEST, TREND, GROWTH and FORECAST
+
+    Fits of range values are cached, so the cells of an array formula, or
+    several formulas, which fit the same data solve it once.
+
+    :return: the first error, else a LinearFit
+    """
+    if is_error(const):
+        return const
+    const = _logical_arg(const, default=True)
+
+    if not isinstance(known_ys, tuple) or \
+            not isinstance(known_xs, (tuple, type(None))):
+        return _solve_linear_fit(known_ys, known_xs, const, degree, log_ys)
+
+    # The cached entry holds known_xs, so its id is not reused while cached
+    return lookup_cache.get(
+        known_ys, ('linear_fit', id(known_xs), const, degree, log_ys),
+        lambda value: (known_xs, _solve_linear_fit(
+            value, known_xs, const, degree, log_ys)))[1]
+
+
+def _solve_linear_fit(known_ys, known_xs, const, degree, log_ys):
+    data = _numeric_matrix(_rows(known_ys), strict=True)
+
+    # A returned string is an error code
+    if isinstance(data, str):
+        return data
+    ys = data[0]
+
+    if known_xs is None:
+        xs = np.arange(1.0, ys.size + 1).reshape(ys.shape)
+    else:
+        data = _numeric_matrix(_rows(known_xs), strict=True)
+        if isinstance(data, str):
+            return data
+        xs = data[0]
+
+    by_rows = False
+    if xs.shape == ys.shape:
+        x_columns = xs.reshape(-1, 1)
+    elif ys.shape[1] == 1 and xs.shape[0] == ys.shape[0]:
+        x_columns = xs
+    elif ys.shape[0] == 1 and xs.shape[1] == ys.shape[1]:
+        x_columns = xs.T
+        by_rows = True
+    else:
+        return REF_ERROR
+
+    y = ys.ravel()
+    if log_ys:
+        if np.any(y <= 0):
+            return NUM_ERROR
+        y = np.log(y)
+
+    if degree > 1:
+        # polynomial fit, columns of x, x^2, ..
+        x_columns = np.hstack(
+            [x_columns ** power for power in range(1, degree + 1)])
+
+    n, k = x_columns.shape
+    design = np.hstack((x_columns, np.ones((n, 1)))) if const else x_columns
+    coefs = np.linalg.lstsq(design, y, rcond=None)[0]
+
+    residuals = y - design @ coefs
+    ss_resid = residuals @ residuals
+    ss_total = ((y - y.mean()) ** 2).sum() if const else y @ y
+    ss_reg = ss_total - ss_resid
+    df = n - design.shape[1]
+    if not const:
+        coefs = np.append(coefs, 0.0)
+
+    with np.errstate(all='ignore'):
+        variance = ss_resid / df
+        std_errs = tuple(np.sqrt(np.diag(
+            np.linalg.pinv(design.T @ design)) * variance))
+        stats = (
+            std_errs[k - 1::-1] + (std_errs[k:] or (NA_ERROR, )),
+            (ss_reg / ss_total, np.sqrt(variance)),
+            ((ss_reg / k) / variance, df),
+            (ss_reg, ss_resid),
+        )
+
+    def excel_value(value):
+        if isinstance(value, (str, int)):
+            # errors, and the degrees of freedom
+            return value
+        value = float(value)
+        return value if np.isfinite(value) else NUM_ERROR
+
+    # excel lists the coefficients in reverse order, the constant last
+    result = (tuple(coefs[-2::-1].tolist()) + (float(coefs[-1]), ), ) + tuple(
+        tuple(map(excel_value, row)) + (NA_ERROR, ) * (k + 1 - len(row))
+        for row in stats)
+    return LinearFit(coefs, result, by_rows, xs)
+
+
+def _linear_predict(known_ys, known_xs, new_xs, const, log_ys=False):
+    """ The y values for new_xs on the fit of known_ys, for TREND, GROWTH """
+    fit = _linear_fit(known_ys, known_xs, const, log_ys=log_ys)
+
+    # A returned string is an error code
+    if isinstance(fit, str):
+        return fit
+
+    if new_xs is None:
+        xs = fit.xs
+    else:
+        data = _numeric_matrix(_rows(new_xs), strict=True)
+        if isinstance(data, str):
+            return data
+        xs = data[0]
+
+    slopes, intercept = fit.coefs[:-1], fit.coefs[-1]
+    if len(slopes) == 1:
+        ys = intercept + slopes[0] * xs
+    elif fit.by_rows and xs.shape[0] == len(slopes):
+        ys = intercept + (slopes @ xs).reshape(1, -1)
+    elif not fit.by_rows and xs.shape[1] == len(slopes):
+        ys = intercept + (xs @ slopes).reshape(-1, 1)
+    else:
+        return REF_ERROR
+
+    if log_ys:
+        ys = np.exp(ys)
+    if new_xs is not None and not list_like(new_xs):
+        return float(ys[0, 0])
+    return tuple(map(tuple, ys.tolist()))
+
+
 def average(*args):
-    data = _numerics(*args, no_bools=True)
+    data = _numeric_parts(*args, no_bools=True)
+
+    # A returned string is an error code
+    if isinstance(data, str):
+        return data
+
+    numerics, columns = data
+    count = len(numerics) + sum(len(rows) for column, rows, _ in columns)
+    if count == 0:
+        return DIV0
+    else:
+        return _sum_parts(numerics, columns) / count
+
+
+def averageif(rng, criteria, average_range=None):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   AVERAGEIF-function-FAEC8E2E-0DEC-4308-AF69-F5576D8AC642
+
+    if average_range is None:
+        average_range = rng
+    return averageifs(average_range, rng, criteria)
+
+
+def averageifs(average_range, *args):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   AVERAGEIFS-function-48910C45-1FC0-4389-A028-F7C5C3001690
+
+    assert_list_like(average_range)
+
+    data = _criteria_column(average_range).total(
+        _criteria_rows(args), no_bools=True)
 
     # A returned string is an error code
     if isinstance(data, str):
         return data
-    elif len(data) == 0:
+
+    total, count = data
+    if count == 0:
         return DIV0
     else:
-        return sum(data) / len(data)
+        return total / count
+
+
+def choose(index_num, *values):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   CHOOSE-function-FC5C184F-CB62-4EC7-A46E-38653B98F5BC
+
+    if is_error(index_num):
+        return index_num
+
+    index_num = coerce_to_number(index_num)
+    if not is_number(index_num) or isinstance(index_num, bool):
+        return VALUE_ERROR
+
+    index_num = int(index_num)
+    if not 1 <= index_num <= len(values):
+        return VALUE_ERROR
+
+    # the values are lazily evaluated, only evaluate the one selected
+    return resolve_thunk(values[index_num - 1])
 
 
 def column(ref):
-    if ref in ERROR_CODES:
+    if is_error(ref):
         return ref
 
     if ref.is_range:
@@ -84,7 +452,7 @@ def concatenate(*args):
     if tuple(flatten(args)) != args:
         return VALUE_ERROR
 
-    error = next((x for x in args if x in ERROR_CODES), None)
+    error = next((x for x in args if is_error(x)), None)
     if error:
         return error
 
@@ -98,10 +466,12 @@ def count(*args):
     total = 0
 
     for arg in args:
-        if isinstance(arg, list):
-            # count inside a list
-            total += len(
-                [x for x in arg if is_number(x) and not isinstance(x, bool)])
+        if _is_large_range(arg):
+            total += _criteria_column(arg).count
+        elif list_like(arg):
+            # count inside a list or range, where text is not counted
+            total += len([x for x in flatten(arg)
+                          if type(x) in (int, float)])
         else:
             total += int(is_number(arg))
 
@@ -116,9 +486,7 @@ def countif(range, criteria):
     # - wildcards not supported  ::TODO:: test if this is no longer true
     # - support of strings with >, <, <=, =>, <> not provided
 
-    valid = find_corresponding_index(range, criteria)
-
-    return len(valid)
+    return len(_criteria_rows((range, criteria)))
 
 
 def countifs(*args):
@@ -130,38 +498,7 @@ def countifs(*args):
                              'pair number of arguments, here %d' % len(args))
 
     if len(args):
-        # find indexes that match first layer of countif
-        indexes = find_corresponding_index(args[0], args[1])
-
-        # get only ranges
-        remaining_ranges = [elem for i, elem in enumerate(args[2:])
-                            if i % 2 == 0]
-
-        # get only criteria
-        remaining_criteria = [elem for i, elem in enumerate(args[2:])
-                              if i % 2 == 1]
-
-        filtered_remaining_ranges = []
-
-        # filter items in remaining_ranges that match valid indexes
-        # from first countif layer
-        for rng in remaining_ranges:
-            filtered_remaining_range = []
-
-            for index, item in enumerate(rng):
-                if index in indexes:
-                    filtered_remaining_range.append(item)
-
-            filtered_remaining_ranges.append(filtered_remaining_range)
-
-        new_tuple = ()
-
-        # rebuild the tuple that will be the argument of next layer
-        for index, rng in enumerate(filtered_remaining_ranges):
-            new_tuple += (rng, remaining_criteria[index])
-
-        # only consider the minimum number across all layer responses
-        return min(countifs(*new_tuple), len(indexes))
+        return len(_criteria_rows(args))
 
     else:
         return float('inf')
@@ -199,6 +536,43 @@ def date(year, month, day):
     return result
 
 
+def forecast(x, known_ys, known_xs):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   FORECAST-and-FORECAST-LINEAR-functions-50ca49c9-7b40-4892-94e4-7ad38bbeda99
+    if is_error(x):
+        return x
+    x = coerce_to_number(x)
+    if not is_number(x) or isinstance(x, bool):
+        return VALUE_ERROR
+
+    known_ys, known_xs = _rows(known_ys), _rows(known_xs)
+    width = len(known_ys[0])
+    if (len(known_ys), width) != (len(known_xs), len(known_xs[0])):
+        xs = flat_values(known_xs)
+        if len(xs) != len(known_ys) * width:
+            return NA_ERROR
+        # the x's and y's are paired in order, (a row and a column)
+        known_xs = tuple(
+            xs[i:i + width] for i in range(0, len(xs), width))
+
+    fit = _linear_fit(known_ys, known_xs, True)
+
+    # A returned string is an error code
+    if isinstance(fit, str):
+        return NA_ERROR if fit == REF_ERROR else fit
+
+    if not np.ptp(fit.xs):
+        return DIV0
+    slope, intercept = fit.result[0]
+    return intercept + slope * x
+
+
+def growth(known_ys, known_xs=None, new_xs=None, const=True):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   GROWTH-function-541a91dc-3d5e-437d-b156-21324e68b80d
+    return _linear_predict(known_ys, known_xs, new_xs, const, log_ys=True)
+
+
 def hlookup(lookup_value, table_array, row_index_num, range_lookup=True):
     """ Horizontal Lookup
 
@@ -218,10 +592,10 @@ def hlookup(lookup_value, table_array, row_index_num, range_lookup=True):
         raise NotImplementedError('Array Formulas not implemented')
 
     if row_index_num <= 0:
-        return '#VALUE!'
+        return VALUE_ERROR
 
     if row_index_num > len(table_array[0]):
-        return '#REF!'
+        return REF_ERROR
 
     result_idx = match(
         lookup_value, table_array[0], match_type=bool(range_lookup))
@@ -241,10 +615,10 @@ def index(array, row_num, col_num=None, rows=None, cols=None):
     if isinstance(array, str):
         return array
 
-    if row_num in ERROR_CODES:
+    if is_error(row_num):
         return row_num
 
-    if col_num in ERROR_CODES:
+    if is_error(col_num):
         return col_num
 
     try:
@@ -297,29 +671,23 @@ def isNa(arg):
         return True
 
 
-def linest(Y, X, const=True, degree=1):  # pragma: no cover  ::TODO::
-    if isinstance(const, str):
-        const = (const.lower() == "true")
-
-    def assert_vector(data):
-        vector = np.array(data)
-        assert 1 in vector.shape
-        return vector.ravel()
-
-    X = assert_vector(X)
-    Y = assert_vector(Y)
-
-    # build the vandermonde matrix
-    A = np.vander(X, degree + 1)
+def linest(known_ys, known_xs=None, const=True, stats=False, degree=None):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   LINEST-function-84d7d0d9-6e50-4101-977a-fa7abf772b6d
+    fit = _linear_fit(known_ys, known_xs, const, degree=degree or 1)
 
-    if not const:
-        # force the intercept to zero
-        A[:, -1] = np.zeros((1, len(X)))
+    # A returned string is an error code
+    if isinstance(fit, str):
+        return fit
 
-    # perform the fit
-    coefs, residuals, rank, sing_vals = np.linalg.lstsq(A, Y, rcond=None)
+    if degree is not None:
+        # ::HACK:: code from func_linest() indexes the coefficients of a
+        # polynomial fit, one linest formula per coefficient
+        return fit.result[0]
 
-    return coefs
+    if is_error(stats):
+        return stats
+    return fit.result if _logical_arg(stats, default=False) else fit.result[:1]
 
 
 def lookup(lookup_value, lookup_array, result_range=None):
@@ -351,8 +719,8 @@ def lookup(lookup_value, lookup_array, result_range=None):
 
         # match across the largest dimension
         if width <= height:
-            match_idx = match(lookup_value, tuple(i[0] for i in lookup_array))
-            result_range = tuple(i[-1] for i in lookup_array)
+            match_idx = match(lookup_value, _lookup_column(lookup_array))
+            result_range = _lookup_column(lookup_array, -1)
         else:
             match_idx = match(lookup_value, lookup_array[0])
             result_range = lookup_array[-1]
@@ -392,15 +760,39 @@ def match(lookup_value, lookup_array, match_type=1):
     :param match_type: The number -1, 0, or 1.
     :return: #N/A if not found, or relative position in `lookup_array`
     """
-    if lookup_value in ERROR_CODES:
+    if is_error(lookup_value):
         return lookup_value
 
+    if lookup_array and list_like(lookup_array[0]):
+        # a range, which needs to be a single row or column
+        if len(lookup_array) == 1:
+            lookup_array = lookup_array[0]
+        elif len(lookup_array[0]) == 1:
+            lookup_array = _lookup_column(lookup_array)
+        else:
+            return NA_ERROR
+
     lookup_value = ExcelCmp(lookup_value)
 
     if match_type == 1:
         # Use a binary search to speed it up.  Excel seems to do this as it
         # would explain the results seen when doing out of order searches.
-        lookup_value = ExcelCmp(lookup_value)
+        if isinstance(lookup_array, tuple) and \
+                len(lookup_array) >= LOOKUP_CACHE_MIN_SIZE:
+            # same search, but over keys built once per range value
+            keys, has_empty, positions = lookup_cache.get(
+                lookup_array, 'approximate', _approximate_match_keys)
+            if has_empty:
+                result = _bisect_right_empty(
+                    keys, lookup_value[:2],
+                    (lookup_value.cmp_type, lookup_value.empty))
+            else:
+                result = bisect_right(keys, lookup_value[:2])
+
+            # back up to the last value with the same type
+            type_positions = positions.get(lookup_value.cmp_type, ())
+            result = bisect_left(type_positions, result)
+            return type_positions[result - 1] + 1 if result else NA_ERROR
 
         result = bisect_right(lookup_array, lookup_value)
         while result and lookup_value.cmp_type != ExcelCmp(
@@ -418,6 +810,7 @@ def match(lookup_value, lookup_array, match_type=1):
                 result[0] = idx
                 return True
 
+        re_compare = None
         if lookup_value.cmp_type == 1:
             # string matches might be wildcards
             re_compare = build_wildcard_re(lookup_value.value)
@@ -426,6 +819,13 @@ def match(lookup_value, lookup_array, match_type=1):
                     if re_compare(val.value):
                         result[0] = idx
                         return True
+
+        if re_compare is None and isinstance(lookup_array, tuple) and \
+                len(lookup_array) >= LOOKUP_CACHE_MIN_SIZE:
+            # hash lookup, with the index built once per range value
+            return lookup_cache.get(
+                lookup_array, 'exact', _exact_match_index).get(
+                lookup_value[:2], NA_ERROR)
     else:
         def compare(idx, val):
             if val < lookup_value:
@@ -434,7 +834,7 @@ def match(lookup_value, lookup_array, match_type=1):
             return val == lookup_value
 
     for i, value in enumerate(lookup_array, 1):
-        if value not in ERROR_CODES:
+        if not is_error(value):
             value = ExcelCmp(value)
             if value.cmp_type == lookup_value.cmp_type and compare(i, value):
                 break
@@ -446,11 +846,11 @@ def mid(text, start_num, num_chars):
     # Excel reference: https://support.office.com/en-us/article/
     #   MID-MIDB-functions-d5f9e25c-d7d6-472e-b568-4ecb12433028
 
-    if text in ERROR_CODES:
+    if is_error(text):
         return text
-    if start_num in ERROR_CODES:
+    if is_error(start_num):
         return start_num
-    if num_chars in ERROR_CODES:
+    if is_error(num_chars):
         return num_chars
 
     start_num = coerce_to_number(start_num)
@@ -467,12 +867,37 @@ def mid(text, start_num, num_chars):
     return str(text)[start_num:start_num + int(num_chars)]
 
 
+def mmult(array1, array2):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   MMULT-function-40593ed7-a3cd-4b6b-b9a3-e4ad3c7245eb
+    array1, array2 = _rows(array1), _rows(array2)
+    if not all(array and array[0] for array in (array1, array2)) or \
+            len(array1[0]) != len(array2):
+        return VALUE_ERROR
+
+    matrices = []
+    for array in (array1, array2):
+        data = _numeric_matrix(array, strict=True)
+
+        # A returned string is an error code
+        if isinstance(data, str):
+            return data
+        matrices.append(data)
+
+    (left, left_ints), (right, right_ints) = matrices
+    result = left @ right
+    if left_ints and right_ints and np.all(
+            np.abs(left) @ np.abs(right) < CriteriaColumn.limit):
+        result = result.astype(np.int64)
+    return tuple(map(tuple, result.tolist()))
+
+
 def mod(number, divisor):
     # Excel reference: https://support.office.com/en-us/article/
     #   MOD-function-9b6cd169-b6ee-406a-a97b-edf2a9dc24f3
-    if number in ERROR_CODES:
+    if is_error(number):
         return number
-    if divisor in ERROR_CODES:
+    if is_error(divisor):
         return divisor
 
     number, divisor = coerce_to_number(number), coerce_to_number(divisor)
@@ -491,7 +916,7 @@ def npv(*args):
     #   NPV-function-8672CB67-2576-4D07-B67B-AC28ACF2A568
 
     for arg in args:
-        if arg in ERROR_CODES:
+        if is_error(arg):
             return arg
 
     rate = args[0] + 1
@@ -504,7 +929,7 @@ def power(number, power):
     #   POWER-function-D3F2908B-56F4-4C3F-895A-07FB519C362A
 
     for arg in (number, power):
-        if arg in ERROR_CODES:
+        if is_error(arg):
             return arg
 
     if number == power == 0:
@@ -518,9 +943,9 @@ def right(text, num_chars=1):
     # Excel reference:  https://support.office.com/en-us/article/
     #   RIGHT-RIGHTB-functions-240267EE-9AFA-4639-A02B-F19E1786CF2F
 
-    if text in ERROR_CODES:
+    if is_error(text):
         return text
-    if num_chars in ERROR_CODES:
+    if is_error(num_chars):
         return num_chars
 
     num_chars = coerce_to_number(num_chars)
@@ -554,7 +979,7 @@ roundup = math_wrap(roundup_unwrapped)
 
 
 def row(ref):
-    if ref in ERROR_CODES:
+    if is_error(ref):
         return ref
 
     if ref.is_range:
@@ -589,19 +1014,52 @@ def sumifs(sum_range, *args):
 
     assert_list_like(sum_range)
 
-    assert len(args) and len(args) % 2 == 0, \
-        'Must have paired criteria and ranges'
+    data = _criteria_column(sum_range).total(_criteria_rows(args))
+
+    # A returned string is an error code
+    if isinstance(data, str):
+        return data
+    return data[0]
 
-    # count the number of times a particular cell matches the criteria
-    index_counts = Counter(it.chain.from_iterable(
-        find_corresponding_index(rng, criteria)
-        for rng, criteria in zip(args[0::2], args[1::2])))
 
-    ifs_count = len(args) // 2
-    max_idx = len(sum_range)
-    indices = tuple(idx for idx, cnt in index_counts.items()
-                    if cnt == ifs_count and idx < max_idx)
-    return sum(_numerics(sum_range[idx] for idx in indices))
+def sumproduct(*arrays):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   SUMPRODUCT-function-16753e75-9f68-4874-94ac-4d2145a2fd2e
+    arrays = tuple(map(_rows, arrays))
+    if not all(a and a[0] for a in arrays) or \
+            len({(len(a), len(a[0])) for a in arrays}) != 1:
+        return VALUE_ERROR
+
+    product = 1.0
+    integral = True
+    for array in arrays:
+        data = _numeric_matrix(array)
+
+        # A returned string is an error code
+        if isinstance(data, str):
+            return data
+        matrix, ints = data
+        product = product * matrix
+        integral &= ints
+
+    total = float(np.sum(product))
+    if integral and np.sum(np.abs(product)) < CriteriaColumn.limit:
+        return int(total)
+    return total
+
+
+def transpose(array):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   TRANSPOSE-function-ED039415-ED8A-4A81-93E9-4B6DFAC76027
+    if not list_like(array):
+        return array
+    return tuple(zip(*_rows(array)))
+
+
+def trend(known_ys, known_xs=None, new_xs=None, const=True):
+    # Excel reference: https://support.office.com/en-us/article/
+    #   TREND-function-e2f135f0-8827-4096-9873-9a7cf7b51ef1
+    return _linear_predict(known_ys, known_xs, new_xs, const)
 
 
 def value(text):
@@ -631,14 +1089,14 @@ def vlookup(lookup_value, table_array, col_index_num, range_lookup=True):
         raise NotImplementedError('Array Formulas not implemented')
 
     if col_index_num <= 0:
-        return '#VALUE!'
+        return VALUE_ERROR
 
     if col_index_num > len(table_array[0]):
-        return '#REF!'
+        return REF_ERROR
 
     result_idx = match(
         lookup_value,
-        [row[0] for row in table_array],
+        _lookup_column(table_array),
         match_type=bool(range_lookup)
     )
 
@@ -652,10 +1110,10 @@ def vlookup(lookup_value, table_array, col_index_num, range_lookup=True):
 def xatan2(value1, value2):
     # Excel reference: https://support.office.com/en-us/article/
     #   ATAN2-function-C04592AB-B9E3-4908-B428-C96B3A565033
-    if value1 in ERROR_CODES:
+    if is_error(value1):
         return value1
 
-    if value2 in ERROR_CODES:
+    if is_error(value2):
         return value2
 
     # swap arguments
@@ -663,7 +1121,7 @@ def xatan2(value1, value2):
 
 
 def xlen(value):
-    if value in ERROR_CODES:
+    if is_error(value):
         return value
 
     if value is None:
@@ -680,28 +1138,34 @@ def xlog(value):
 
 
 def xmax(*args):
-    data = _numerics(*args, no_bools=True)
+    data = _numeric_parts(*args, no_bools=True)
 
     # A returned string is an error code
     if isinstance(data, str):
         return data
 
+    numerics, columns = data
+    data = numerics + tuple(column.max(rows) for column, rows, _ in columns)
+
     # however, if no non numeric cells, return zero (is what excel does)
-    elif len(data) < 1:
+    if len(data) < 1:
         return 0
     else:
         return max(data)
 
 
 def xmin(*args):
-    data = _numerics(*args, no_bools=True)
+    data = _numeric_parts(*args, no_bools=True)
 
     # A returned string is an error code
     if isinstance(data, str):
         return data
 
+    numerics, columns = data
+    data = numerics + tuple(column.min(rows) for column, rows, _ in columns)
+
     # however, if no non numeric cells, return zero (is what excel does)
-    elif len(data) < 1:
+    if len(data) < 1:
         return 0
     else:
         return min(data)
@@ -711,9 +1175,9 @@ def xround(number, num_digits=0):
     # Excel reference: https://support.office.com/en-us/article/
     #   ROUND-function-c018c5d8-40fb-4053-90b1-b3e7f61a213c
 
-    if number in ERROR_CODES:
+    if is_error(number):
         return number
-    if num_digits in ERROR_CODES:
+    if is_error(num_digits):
         return num_digits
 
     number, num_digits = coerce_to_number(number), coerce_to_number(num_digits)
@@ -734,12 +1198,13 @@ def xround(number, num_digits=0):
 
 
 def xsum(*args):
-    data = _numerics(*args, no_bools=True)
+    data = _numeric_parts(*args, no_bools=True)
     if isinstance(data, str):
         return data
 
     # if no non numeric cells, return zero (is what excel does)
-    return sum(data)
+    numerics, columns = data
+    return _sum_parts(numerics, columns)
 
 
 def yearfrac(start_date, end_date, basis=0):
@@ -1,6 +1,8 @@
 import calendar
 import collections
 import datetime as dt
+import functools
+import itertools
 import operator
 import re
 
@@ -12,13 +14,36 @@ from openpyxl.utils import (
 )
 
 
-ERROR_CODES = frozenset(Tokenizer.ERROR_CODES)
-DIV0 = '#DIV/0!'
+class ExcelError(str):
+    """ An excel error value, such as #N/A or #VALUE!
+
+    There is one instance per error code, and it compares equal to the
+    error code string.  So the type, or identity, tells an error apart from
+    text, while the value can still be used as the string it always was.
+    """
+    __slots__ = ()
+    _errors = {}
+
+    def __new__(cls, code):
+        error = cls._errors.get(code)
+        if error is None:
+            if code not in Tokenizer.ERROR_CODES:
+                raise ValueError('Unknown error code: {}'.format(code))
+            error = cls._errors[code] = super().__new__(cls, code)
+        return error
+
+    def __reduce__(self):
+        return ExcelError, (str(self), )
+
+
+ERROR_CODES = frozenset(map(ExcelError, Tokenizer.ERROR_CODES))
+DIV0 = ExcelError('#DIV/0!')
 EMPTY = '#EMPTY!'
-VALUE_ERROR = '#VALUE!'
-NUM_ERROR = '#NUM!'
-NA_ERROR = '#N/A'
-NAME_ERROR = "#NAME?"
+VALUE_ERROR = ExcelError('#VALUE!')
+NUM_ERROR = ExcelError('#NUM!')
+NA_ERROR = ExcelError('#N/A')
+NAME_ERROR = ExcelError("#NAME?")
+REF_ERROR = ExcelError('#REF!')
 
 R1C1_ROW_RE_STR = r"R(\[-?\d+\]|\d+)?"
 R1C1_COL_RE_STR = r"C(\[-?\d+\]|\d+)?"
@@ -51,6 +76,9 @@ STAR_RE = re.compile(r'\*(?<!~)')
 MAX_COL = 16384
 MAX_ROW = 1048576
 
+# number of address strings whose address objects are interned
+ADDRESS_CACHE_SIZE = 1 << 16
+
 VALID_R1C1_RANGE_ITEM_COMBOS = {
     (0, 1, 0, 1),
     (1, 0, 1, 0),
@@ -243,18 +271,29 @@ class AddressRange(collections.namedtuple(
     @property
     def rows(self):
         """Get each address for every cell, yields one row at a time."""
-        col_range = self.start.col_idx, self.end.col_idx + 1
+        sheet, from_indices = self.sheet, AddressCell.from_indices
+        columns = self._columns()
         for row in range(self.start.row, self.end.row + 1):
-            yield (AddressCell((col, row, col, row), sheet=self.sheet)
-                   for col in range(*col_range))
+            yield (from_indices(col, row, sheet, column)
+                   for col, column in columns)
 
     @property
     def cols(self):
         """Get each address for every cell, yields one column at a time."""
-        col_range = self.start.col_idx, self.end.col_idx + 1
-        for col in range(*col_range):
-            yield (AddressCell((col, row, col, row), sheet=self.sheet)
-                   for row in range(self.start.row, self.end.row + 1))
+        sheet, from_indices = self.sheet, AddressCell.from_indices
+        rows = range(self.start.row, self.end.row + 1)
+        for col, column in self._columns():
+            yield (from_indices(col, row, sheet, column) for row in rows)
+
+    def _columns(self):
+        """ The col_idx and column letter of each column
+
+        The cells of a range are built from these, and the row numbers,
+        without validating or formatting each one.
+        """
+        return tuple(
+            (col, (col or '') and get_column_letter(col))
+            for col in range(self.start.col_idx, self.end.col_idx + 1))
 
     @property
     def resolve_range(self):
@@ -281,14 +320,12 @@ class AddressRange(collections.namedtuple(
         elif isinstance(address, AddressCell):
             return AddressCell(address, sheet=sheet)
 
-        sheetname, addr = split_sheetname(address, sheet=sheet)
-        addr_tuple, sheetname = range_boundaries(
-            addr, sheet=sheetname, cell=cell)
+        elif cell is None:
+            # without a cell the address depends only on the strings, so
+            # the address objects are interned
+            return _interned_address(address, sheet)
 
-        if None in addr_tuple or addr_tuple[0:2] != addr_tuple[2:]:
-            return AddressRange(addr_tuple, sheet=sheetname)
-        else:
-            return AddressCell(addr_tuple, sheet=sheetname)
+        return _build_address(address, sheet, cell)
 
 
 class AddressCell(collections.namedtuple(
@@ -361,6 +398,26 @@ class AddressCell(collections.namedtuple(
     def __str__(self):
         return self.address
 
+    @classmethod
+    def from_indices(cls, col_idx, row, sheet='', column=None):
+        """ Construct an `AddressCell` from its 1 based indices
+
+        Unlike the constructor, the indices are not validated, so this is
+        a faster way to build the cells of a range.
+
+        :param col_idx: column number
+        :param row: row number
+        :param sheet: sheet name
+        :param column: the column letter, if already known
+        :return: `AddressCell`
+        """
+        if column is None:
+            column = (col_idx or '') and get_column_letter(col_idx)
+        coordinate = column + str(row or '')
+        address = sheet + '!' + coordinate if sheet else coordinate
+        return tuple.__new__(
+            cls, (address, sheet, col_idx, row, coordinate))
+
     # Is this address a range?
     is_range = False
 
@@ -404,10 +461,8 @@ class AddressCell(collections.namedtuple(
         :param col_inc: Number of columns to offset
         :return: `AddressCell`
         """
-        new_col = self.inc_col(col_inc)
-        new_row = self.inc_row(row_inc)
-        return AddressCell((new_col, new_row, new_col, new_row),
-                           sheet=self.sheet)
+        return AddressCell.from_indices(
+            self.inc_col(col_inc), self.inc_row(row_inc), self.sheet)
 
     @property
     def resolve_range(self):
@@ -433,6 +488,140 @@ class AddressCell(collections.namedtuple(
         return addr
 
 
+def _build_address(address, sheet, cell=None):
+    sheetname, addr = split_sheetname(address, sheet=sheet)
+    addr_tuple, sheetname = range_boundaries(
+        addr, sheet=sheetname, cell=cell)
+
+    if None in addr_tuple or addr_tuple[0:2] != addr_tuple[2:]:
+        return AddressRange(addr_tuple, sheet=sheetname)
+    else:
+        return AddressCell(addr_tuple, sheet=sheetname)
+
+
+# (address string, sheet) -> the canonical AddressRange or AddressCell
+_interned_address = functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)(
+    _build_address)
+
+
+def _address_bounds(address):
+    """ (min_col, min_row, max_col, max_row) of an address, unbounded
+    columns and rows, (index 0), are mapped to their full extent
+    """
+    if address.is_range:
+        start, end = address.start, address.end
+    else:
+        start = end = address
+    return (start.col_idx or 1, start.row or 1,
+            end.col_idx or MAX_COL, end.row or MAX_ROW)
+
+
+class RangeIndex:
+    """ Spatial index of the rectangles of ranges, (tables, referenced
+    ranges, ...), to find those which contain or overlap an address
+
+    The ranges of each sheet are kept in a centered interval tree over
+    their rows, which is rebuilt on the first query after a change.
+    """
+
+    def __init__(self):
+        # sheet -> key -> (min_col, min_row, max_col, max_row)
+        self._bounds = collections.defaultdict(dict)
+        self._trees = {}
+
+    def __len__(self):
+        return sum(map(len, self._bounds.values()))
+
+    def add(self, address, key=None):
+        """ Add a range to the index
+
+        :param address: `AddressRange` or `AddressCell`, or a str of one
+        :param key: returned by the queries, defaults to the address
+        """
+        address = AddressRange(address)
+        key = address if key is None else key
+        self._bounds[address.sheet][key] = _address_bounds(address)
+        self._trees.pop(address.sheet, None)
+
+    def remove(self, address, key=None):
+        """ Remove a range from the index, if present """
+        address = AddressRange(address)
+        key = address if key is None else key
+        if self._bounds[address.sheet].pop(key, None) is not None:
+            self._trees.pop(address.sheet, None)
+
+    def containing(self, address):
+        """ The keys of the ranges which contain all of the address """
+        address = AddressRange(address)
+        min_col, min_row, max_col, max_row = bounds = _address_bounds(address)
+        return [key for (col_lo, row_lo, col_hi, row_hi), key
+                in self._query(address.sheet, bounds)
+                if row_lo <= min_row and max_row <= row_hi and
+                col_lo <= min_col and max_col <= col_hi]
+
+    def overlapping(self, address):
+        """ The keys of the ranges which share any cell with the address """
+        address = AddressRange(address)
+        min_col, _, max_col, _ = bounds = _address_bounds(address)
+        return [key for (col_lo, _, col_hi, _), key
+                in self._query(address.sheet, bounds)
+                if col_lo <= max_col and min_col <= col_hi]
+
+    def _query(self, sheet, bounds):
+        """ The (bounds, key) of the ranges whose rows overlap bounds """
+        tree = self._trees.get(sheet)
+        if tree is None:
+            tree = self._trees[sheet] = self._build_tree(
+                [(item_bounds, key) for key, item_bounds
+                 in self._bounds.get(sheet, {}).items()])
+
+        lo, hi = bounds[1], bounds[3]
+        nodes = [tree]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+
+            center, by_start, by_end, left, right = node
+            if hi < center:
+                # the ranges here end at or after center, check the starts
+                for item in by_start:
+                    if item[0][1] > hi:
+                        break
+                    yield item
+                nodes.append(left)
+
+            elif lo > center:
+                # the ranges here start at or before center, check the ends
+                for item in by_end:
+                    if item[0][3] < lo:
+                        break
+                    yield item
+                nodes.append(right)
+
+            else:
+                yield from by_start
+                nodes.extend((left, right))
+
+    @classmethod
+    def _build_tree(cls, items):
+        """ node: (center, items by start, items by end, left, right) """
+        if not items:
+            return None
+
+        rows = sorted(row for (_, lo, _, hi), key in items for row in (lo, hi))
+        center = rows[len(rows) // 2]
+
+        here = [item for item in items if item[0][1] <= center <= item[0][3]]
+        return (
+            center,
+            sorted(here, key=lambda item: item[0][1]),
+            sorted(here, key=lambda item: item[0][3], reverse=True),
+            cls._build_tree([item for item in items if item[0][3] < center]),
+            cls._build_tree([item for item in items if item[0][1] > center]),
+        )
+
+
 def unquote_sheetname(sheetname):
     """
     Remove quotes from around, and embedded "''" in, quoted sheetnames
@@ -789,27 +978,222 @@ def get_linest_degree(cell):
     return max(degree, 1), coef
 
 
-def flatten(data, coerce=lambda x: x):
+class RangeValue(tuple):
+    """ The value of a range, a tuple of the row tuples
+
+    It is still the tuple of tuples it always was, but it knows its shape,
+    and builds a flat tuple of its values once, so that its values can be
+    iterated over without recursing through the rows.
+    """
+
+    @property
+    def shape(self):
+        return len(self), len(self[0]) if self else 0
+
+    @property
+    def flat(self):
+        """ The values of the range, row by row, in a flat tuple """
+        try:
+            return self._flat
+        except AttributeError:
+            self._flat = tuple(itertools.chain.from_iterable(self))
+            return self._flat
+
+    def __reduce__(self):
+        # the flat tuple is not saved, it is rebuilt when needed
+        return RangeValue, (tuple(self), )
+
+
+# types which are never flattened
+FLAT_TYPES = frozenset((int, float, bool, str, type(None), ExcelError))
+
+
+def _no_coerce(value):
+    return value
+
+
+def flatten(data, coerce=_no_coerce):
     """ flatten items, converting top level items as needed
 
     :param data: data to flatten
     :param coerce: apply coercion to top level, but not to sub ranges
     :return: flattened (coerced) items
     """
-    if isinstance(data, collections.Iterable) and not isinstance(
+    if type(data) is RangeValue and coerce is _no_coerce:
+        yield from data.flat
+
+    elif type(data) not in FLAT_TYPES and isinstance(
+            data, collections.Iterable) and not isinstance(
             data, (str, AddressRange, AddressCell)):
         for item in data:
-            yield from flatten(coerce(item))
+            item = coerce(item)
+            if type(item) in FLAT_TYPES:
+                yield item
+            else:
+                yield from flatten(item)
     else:
         yield coerce(data)
 
 
+def flat_values(data):
+    """ The flattened values, as a tuple
+
+    :param data: a range value, or data to flatten
+    :return: tuple of the values, the range's own flat tuple if a range
+    """
+    if type(data) is RangeValue:
+        return data.flat
+    return tuple(flatten(data))
+
+
 def uniqueify(seq):
     seen = set()
     return tuple(x for x in seq if x not in seen and not seen.add(x))
 
 
+def resolve_thunk(value):
+    """ Evaluate a lazily passed function argument
+
+    The compiled code passes the arguments of functions like IF() and
+    CHOOSE() which may not be needed as lambdas, so that only the branch
+    actually taken, and its precedent cells, is evaluated.
+
+    :param value: a value or a thunk (callable with no arguments)
+    :return: the value
+    """
+    return value() if callable(value) else value
+
+
+class RangeCache:
+    """ Cache data derived from range values, such as lookup indices
+
+    The value of a range is built once when the range is evaluated, and is
+    replaced when the range is reset.  So the identity of the value is used
+    as its version.  A reference to the value is held, so that its id can
+    not be reused while it is in the cache.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.cache = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, value, key, build):
+        """ Return the data for the value, building it if needed
+
+        :param value: the range value the data is derived from
+        :param key: identifies which data is derived from the value
+        :param build: function of the value which builds the data
+        :return: the data
+        """
+        cache_key = id(value), key
+        entry = self.cache.get(cache_key)
+        if entry is not None and entry[0] is value:
+            self.hits += 1
+            self.cache.move_to_end(cache_key)
+        else:
+            self.misses += 1
+            entry = self.cache[cache_key] = value, build(value)
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return entry[1]
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+
+class MemoizedFunction:
+    """ Cache the results of a pure function, keyed by its argument values
+
+    Range values (tuples) are keyed by their identity, which is also their
+    version, see `RangeCache`.  Calls with unhashable arguments, (such as
+    lists), are not cached.
+    """
+
+    def __init__(self, func, maxsize=1024):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.maxsize = maxsize
+        self.cache = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def __call__(self, *args, **kwargs):
+        if kwargs:
+            return self.func(*args, **kwargs)
+
+        key = tuple((tuple, id(arg)) if isinstance(arg, tuple)
+                    else (type(arg), arg) for arg in args)
+        try:
+            entry = self.cache.get(key)
+        except TypeError:
+            return self.func(*args)
+
+        if entry is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        else:
+            self.misses += 1
+            # the args are held so the ids of the ranges are not reused
+            entry = self.cache[key] = args, self.func(*args)
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return entry[1]
+
+    @property
+    def hit_rate(self):
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+
+@functools.lru_cache(maxsize=4096)
+def _number_from_str(value):
+    """ The number a string converts to, else None
+
+    Converting text raises, which is slow, and the same text is often
+    converted many times, so the conversions are cached.
+    """
+    if '.' not in value:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def is_error(value):
+    """ Is the value an excel error
+
+    Only `ExcelError`s are errors, text which looks like an error code is
+    text.  Values from where the type is lost, (text files, values given
+    to set_value()), are converted with `as_error()`.
+    """
+    return type(value) is ExcelError
+
+
+def as_error(value):
+    """ An error code string as its `ExcelError`, other values unchanged """
+    if type(value) is str and value in ERROR_CODES:
+        return ExcelError(value)
+    return value
+
+
 def is_number(value):
+    value_type = type(value)
+    if value_type in (int, float, bool):
+        return True
+    elif value_type is str:
+        return _number_from_str(value) is not None
+    elif value_type is ExcelError or value is None:
+        return False
+
     try:
         float(value)
         return True
@@ -818,26 +1202,34 @@ def is_number(value):
 
 
 def coerce_to_number(value, raise_div0=True):
-    if not isinstance(value, str):
-        if isinstance(value, int):
-            return value
-        if is_number(value) and int(value) == float(value):
-            return int(value)
+    value_type = type(value)
+    if value_type is str:
+        if value == DIV0 and raise_div0:
+            return 1 / 0
+        number = _number_from_str(value)
+        return value if number is None else number
+
+    elif value_type is float:
+        return int(value) if value.is_integer() else value
+
+    elif value_type in (int, bool) or value is None:
         return value
 
-    try:
-        if value == DIV0 and raise_div0:
+    elif value_type is ExcelError:
+        if value is DIV0 and raise_div0:
             return 1 / 0
-        elif '.' not in value:
-            return int(value)
-    except (ValueError, TypeError):
-        pass
+        return value
 
-    try:
-        return float(value)
-    except (ValueError, TypeError):
+    elif isinstance(value, str):
+        return coerce_to_number(str(value), raise_div0=raise_div0)
+
+    elif isinstance(value, int):
         return value
 
+    elif is_number(value) and int(value) == float(value):
+        return int(value)
+    return value
+
 
 def coerce_to_string(value):
     if isinstance(value, bool):
@@ -860,7 +1252,7 @@ def math_wrap(bare_func):
         # this is a bit of a ::HACK:: to quickly address the most common cases
         # for reasonable math function parameters
         for arg in args:
-            if arg in ERROR_CODES:
+            if is_error(arg):
                 return arg
         if not (is_number(args[0]) or args[0] in (None, EMPTY)):
             return VALUE_ERROR
@@ -930,6 +1322,7 @@ def date_from_int(datestamp):
     return date.year, date.month, date.day
 
 
+@functools.lru_cache(maxsize=1024)
 def build_wildcard_re(lookup_value):
     regex = QUESTION_MARK_RE.sub('.', STAR_RE.sub('.*', lookup_value))
     if regex != lookup_value:
@@ -940,28 +1333,39 @@ def build_wildcard_re(lookup_value):
         return None
 
 
-def criteria_parser(criteria):
-    """
-    General rules:
+Criteria = collections.namedtuple('Criteria', 'op value wildcard')
 
-        Criteria will be coerced to numbers,
-        For equality comparisions, values will be coerced to numbers
-        < and > will always be False when comparing strings to numbers
-        <> will always be True when comparing strings to numbers
 
-       You can use the wildcard characters—the question mark (?) and
-       asterisk (*)—as the criteria argument. A question mark matches
-       any single character; an asterisk matches any sequence of
-       characters. If you want to find an actual question mark or
-       asterisk, type a tilde (~) preceding the character.
-    """
+def _hashable_lru_cache(maxsize):
+    """ lru_cache, which calls the function directly for unhashable args """
+    def decorator(func):
+        cached = functools.lru_cache(maxsize=maxsize, typed=True)(func)
+
+        @functools.wraps(func)
+        def wrapper(arg):
+            try:
+                hash(arg)
+            except TypeError:
+                return func(arg)
+            return cached(arg)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
 
+
+@_hashable_lru_cache(maxsize=1024)
+def parse_criteria(criteria):
+    """ The operator and operand of a criteria, as used by criteria_parser()
+
+    :param criteria: number, or string with an optional operator prefix
+    :return: Criteria with the operator, the operand as a number or a
+        lowercase string, and for wildcard criteria their check
+    """
     if is_number(criteria):
         # numeric equals comparision
-        criteria = coerce_to_number(criteria)
-
-        def check(x):
-            return is_number(x) and coerce_to_number(x) == criteria
+        return Criteria(operator.eq, coerce_to_number(criteria), None)
 
     elif isinstance(criteria, str):
         match = OPERATORS_RE.match(criteria)
@@ -972,38 +1376,305 @@ def criteria_parser(criteria):
         if op == operator.eq:
 
             if is_number(value):
-                return criteria_parser(value)
+                return parse_criteria(value)
 
             check = build_wildcard_re(value)
             if check is not None:
-                return check
+                return Criteria(op, value.lower(), check)
 
         if is_number(value):
-            value = coerce_to_number(value)
+            return Criteria(op, coerce_to_number(value), None)
+        else:
+            return Criteria(op, value.lower(), None)
+
+    else:
+        raise ValueError("Couldn't parse criteria: {}".format(criteria))
+
+
+@_hashable_lru_cache(maxsize=1024)
+def criteria_parser(criteria):
+    """
+    General rules:
+
+        Criteria will be coerced to numbers,
+        For equality comparisions, values will be coerced to numbers
+        < and > will always be False when comparing strings to numbers
+        <> will always be True when comparing strings to numbers
+        Empty values are neither strings nor numbers, so likewise
+
+       You can use the wildcard characters—the question mark (?) and
+       asterisk (*)—as the criteria argument. A question mark matches
+       any single character; an asterisk matches any sequence of
+       characters. If you want to find an actual question mark or
+       asterisk, type a tilde (~) preceding the character.  Only
+       strings match a wildcard.
+    """
+
+    parsed = parse_criteria(criteria)
+    op, value = parsed.op, parsed.value
 
+    if parsed.wildcard is not None:
+        wildcard = parsed.wildcard
+
+        def check(x):
+            return isinstance(x, str) and wildcard(x)
+
+    elif not isinstance(value, str):
+        if op == operator.eq:
+            # numeric equals comparision
             def check(x):
-                if isinstance(x, str):
-                    # string always compare False unless '!='
-                    return op == operator.ne
-                else:
-                    return op(x, value)
-        else:
-            value = value.lower()
+                return is_number(x) and coerce_to_number(x) == value
 
+        else:
             def check(x):
-                """Compare with a string"""
-                if not isinstance(x, str):
-                    # non string always compare False unless '!='
+                if not isinstance(x, (int, float)):
+                    # strings and empty always compare False unless '!='
                     return op == operator.ne
                 else:
-                    return op(x.lower(), value)
-
+                    return op(x, value)
     else:
-        raise ValueError("Couldn't parse criteria: {}".format(criteria))
+        def check(x):
+            """Compare with a string"""
+            if not isinstance(x, str):
+                # non string always compare False unless '!='
+                return op == operator.ne
+            else:
+                return op(x.lower(), value)
 
     return check
 
 
+class CriteriaColumn:
+    """ A range of values as numpy columns, for criteria masks and reductions
+
+    The masks match criteria_parser(), which is used directly for columns
+    whose values numpy can not compare the same way.
+    """
+    limit = 2 ** 53
+
+    def __init__(self, values):
+        assert_list_like(values)
+        self.values = values = flat_values(values)
+        self.size = size = len(values)
+
+        self.is_str = np.fromiter(
+            (isinstance(x, str) for x in values), dtype=bool, count=size)
+        self.is_empty = np.fromiter(
+            (x is None for x in values), dtype=bool, count=size)
+        self.is_bool = np.fromiter(
+            (isinstance(x, bool) for x in values), dtype=bool, count=size)
+        self.is_real = np.fromiter(
+            (isinstance(x, (int, float)) for x in values),
+            dtype=bool, count=size)
+        self.is_number = np.fromiter(
+            map(is_number, values), dtype=bool, count=size)
+        self.is_int = np.fromiter(
+            (isinstance(x, int) for x in values), dtype=bool, count=size)
+        self.is_error = np.fromiter(
+            map(is_error, values), dtype=bool, count=size)
+
+        self.numbers = np.fromiter(
+            (float(x) if is_num else np.nan
+             for x, is_num in zip(values, self.is_number)),
+            dtype=float, count=size)
+        strings = [x.lower() if isinstance(x, str) else '' for x in values]
+        self.strings = np.array(strings, dtype=str)
+        self._unique_strings = None
+        self._keys = None
+
+        # numpy drops trailing nulls from strings, and compares all
+        # numbers as floats
+        self.exact = (
+            not np.any(~(self.is_str | self.is_empty | self.is_real)) and
+            not any(x.endswith('\0') for x in strings) and
+            not np.any(np.abs(self.numbers) >= self.limit))
+
+    def mask(self, criteria):
+        """ Boolean mask of the values which meet the criteria """
+        mask = self._mask(criteria) if self.exact else None
+        if mask is None:
+            check = criteria_parser(criteria)
+            mask = np.fromiter(
+                (bool(check(x)) for x in self.values),
+                dtype=bool, count=self.size)
+        return mask
+
+    def _mask(self, criteria):
+        op, value, wildcard = parse_criteria(criteria)
+
+        if wildcard is not None:
+            if self._unique_strings is None:
+                self._unique_strings = np.unique(
+                    self.strings, return_inverse=True)
+            unique, inverse = self._unique_strings
+            matched = np.fromiter(
+                map(wildcard, unique), dtype=bool, count=len(unique))
+            return self.is_str & matched[inverse]
+
+        elif not isinstance(value, str):
+            value = float(value)
+            if abs(value) >= self.limit:
+                return None
+            elif op == operator.eq:
+                return self.is_number & (self.numbers == value)
+            elif op == operator.ne:
+                return ~self.is_real | (self.numbers != value)
+            else:
+                return self.is_real & op(self.numbers, value)
+
+        elif op == operator.ne:
+            return ~self.is_str | (self.strings != value)
+        else:
+            return self.is_str & op(self.strings, value)
+
+    @property
+    def keys(self):
+        """ The equality key of each value, see `CriteriaGroups.key` """
+        if self._keys is None:
+            self._keys = [
+                ('n', number) if is_num and number == number else
+                ('s', string) if is_str else None
+                for is_num, number, is_str, string in zip(
+                    self.is_number, self.numbers.tolist(),
+                    self.is_str, self.strings.tolist())]
+        return self._keys
+
+    def reals(self, selected=None, no_bools=False):
+        """ The rows with ints and floats, as for `excellib._numerics`
+
+        :param selected: boolean mask, or sorted array of indices, which
+            will be truncated to the size of the column.  Default is all.
+        :param no_bools: exclude booleans
+        :return: the first error, else the sorted array of indices
+        """
+        if selected is None:
+            rows = None
+            errors = np.flatnonzero(self.is_error)
+            reals = self.is_real
+        else:
+            if selected.dtype == bool:
+                rows = np.flatnonzero(selected[:self.size])
+            else:
+                rows = selected[selected < self.size]
+            errors = rows[self.is_error[rows]]
+            reals = self.is_real[rows]
+
+        if len(errors):
+            return self.values[errors[0]]
+
+        if no_bools:
+            reals = reals & ~(
+                self.is_bool if rows is None else self.is_bool[rows])
+        return np.flatnonzero(reals) if rows is None else rows[reals]
+
+    def sum(self, rows, start=0):
+        """ Sum of the values in rows, as python's sum(), so floats are
+        added in order, and an int if they and start are all ints
+        """
+        numbers = self.numbers[rows]
+        integral = type(start) is int and bool(np.all(self.is_int[rows]))
+        if not self.exact or abs(start) >= self.limit or (
+                integral and np.abs(numbers).sum() >= self.limit):
+            # a float sum of these would not be exact
+            return sum((self.values[i] for i in rows), start)
+
+        if integral:
+            return start + int(numbers.sum())
+        # accumulate is sequential, where sum() is pairwise
+        return float(np.add.accumulate(
+            np.concatenate(((start, ), numbers)))[-1])
+
+    def max(self, rows):
+        """ Largest of the values in rows, which must not be empty """
+        if not self.exact:
+            return max(self.values[i] for i in rows)
+        return self.values[rows[np.argmax(self.numbers[rows])]]
+
+    def min(self, rows):
+        """ Smallest of the values in rows, which must not be empty """
+        if not self.exact:
+            return min(self.values[i] for i in rows)
+        return self.values[rows[np.argmin(self.numbers[rows])]]
+
+    def total(self, selected, no_bools=False):
+        """ Sum and count the selected numbers
+
+        :param selected: boolean mask, or sorted array of indices
+        :param no_bools: exclude booleans
+        :return: the first error, else a tuple of the sum and count
+        """
+        rows = self.reals(selected, no_bools=no_bools)
+        if isinstance(rows, str):
+            return rows
+        return self.sum(rows), len(rows)
+
+    @property
+    def count(self):
+        """ The number of ints and floats, as COUNT() of a range """
+        return int(np.count_nonzero(self.is_real & ~self.is_bool))
+
+
+class CriteriaGroups:
+    """ Rows of criteria columns, grouped by their equality keys
+
+    Conditional aggregations which differ only by their equality criteria
+    can then select their rows with a dict lookup.  The index is only
+    built once it has been asked for twice.
+    """
+
+    def __init__(self, ranges, columns):
+        # the ranges are held to keep the identities of their values
+        self.ranges = ranges
+        self.columns = columns
+        self.exact = all(column.exact for column in columns)
+        self.uses = 0
+        self.rows = None
+
+    @staticmethod
+    def key(criteria):
+        """ The key of the values an equality criteria matches, else None
+
+        Numbers match by their float value and strings case insensitively,
+        as for `CriteriaColumn.mask`
+        """
+        try:
+            op, value, wildcard = parse_criteria(criteria)
+        except ValueError:
+            return None
+
+        if op != operator.eq or wildcard is not None:
+            return None
+        elif isinstance(value, str):
+            return 's', value
+        elif abs(value) < CriteriaColumn.limit:
+            return 'n', float(value)
+        return None
+
+    def select(self, criterias):
+        """ Sorted indices of the rows meeting every equality criteria
+
+        :param criterias: one criteria for each column
+        :return: indices, or None if not an equality criteria or not indexed
+        """
+        keys = tuple(map(self.key, criterias))
+        if not self.exact or None in keys:
+            return None
+
+        self.uses += 1
+        if self.uses < 2:
+            return None
+
+        if self.rows is None:
+            rows = {}
+            for i, row_keys in enumerate(
+                    zip(*(column.keys for column in self.columns))):
+                if None not in row_keys:
+                    rows.setdefault(row_keys, []).append(i)
+            self.rows = {k: np.array(v) for k, v in rows.items()}
+
+        return self.rows.get(keys, np.zeros(0, dtype=int))
+
+
 def find_corresponding_index(rng, criteria):
     return tuple(find_corresponding_index_generator(rng, criteria))
 
@@ -1034,7 +1705,7 @@ def type_cmp_value(value):
     :param value: Operand
     :return: tuple of type precedence and the default to use
     """
-    if value in ERROR_CODES:
+    if is_error(value):
         return 3, value
     elif isinstance(value, bool):
         return 2, False
@@ -1087,10 +1758,95 @@ class ExcelCmp(collections.namedtuple('ExcelCmp', 'cmp_type value empty')):
         return not self == other
 
 
+NUMERIC_ARRAY_OPS = frozenset(('Add', 'Sub', 'Mult', 'Div')) | COMPARISION_OPS
+
+
+def _numeric_array(operand):
+    """ An operand of only numbers and errors as numpy arrays
+
+    :return: None if other values, else a tuple of the values (object
+        array), the numbers (float array) and the mask of the errors
+    """
+    values = np.array(operand, dtype=object)
+    if values.ndim > 2:
+        return None
+
+    types = set(map(type, values.flat))
+    if not types <= {int, float, ExcelError}:
+        return None
+
+    if ExcelError in types:
+        errors = np.fromiter(
+            map(is_error, values.flat),
+            dtype=bool, count=values.size).reshape(values.shape)
+        numbers = np.where(errors, 0, values).astype(float)
+    else:
+        errors = None
+        numbers = values.astype(float)
+
+    # ints beyond this are not exact as floats
+    if int in types and np.any(np.abs(numbers) >= 2 ** 53):
+        return None
+    return values, numbers, errors
+
+
 def build_operator_operand_fixup(capture_error_state):
 
+    def numeric_array_fixup(left_op, op, right_op):
+        """ Arrays of numbers (and errors) are evaluated with numpy
+
+        :return: the result, or None if not only numbers and errors
+        """
+        left = _numeric_array(left_op)
+        right = left and _numeric_array(right_op)
+        if right is None:
+            return None
+        (left_values, left, left_error), (right_values, right, right_error) = \
+            left, right
+
+        try:
+            left, right = np.broadcast_arrays(left, right)
+        except ValueError:
+            return None
+        if left.ndim != 2:
+            return None
+
+        with np.errstate(all='ignore'):
+            result = PYTHON_AST_OPERATORS[op](left, right)
+
+        result = result.astype(object)
+        if op == 'Div':
+            div0 = right == 0
+            if np.any(div0):
+                capture_error_state(
+                    False, 'Values: division by zero in array operation')
+                result[div0] = DIV0
+
+        elif op not in COMPARISION_OPS:
+            # as with coerce_to_number(), integral operands give ints
+            integral = (np.floor(left) == left) & (np.floor(right) == right)
+            ints = np.where(integral, result, 0)
+            if np.any(np.abs(ints) >= 2 ** 53):
+                return None
+            result[integral] = ints.astype(np.int64).astype(object)[integral]
+
+        # errors in the operands are the results, left before right
+        for values, errors in ((right_values, right_error),
+                               (left_values, left_error)):
+            if errors is not None:
+                errors = np.broadcast_to(errors, result.shape)
+                result[errors] = np.broadcast_to(
+                    values, result.shape)[errors]
+
+        return tuple(map(tuple, result.tolist()))
+
     def array_fixup(left_op, op, right_op):
         """use numpy broadcasting for ranges"""
+        if op in NUMERIC_ARRAY_OPS:
+            result = numeric_array_fixup(left_op, op, right_op)
+            if result is not None:
+                return result
+
         # ::TODO:: this needs better error processing to match excel behavior
         left_op = np.array(left_op, dtype=object)
         right_op = np.array(right_op, dtype=object)
@@ -1114,10 +1870,10 @@ def build_operator_operand_fixup(capture_error_state):
             String / Number multiplication
         """
         left_list, right_list = list_like(left_op), list_like(right_op)
-        if not left_list and left_op in ERROR_CODES:
+        if not left_list and is_error(left_op):
             return left_op
 
-        if not right_list and right_op in ERROR_CODES:
+        if not right_list and is_error(right_op):
             return right_op
 
         if left_list or right_list:
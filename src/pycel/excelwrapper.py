@@ -13,7 +13,14 @@ from openpyxl import load_workbook
 from openpyxl.cell.cell import Cell
 from openpyxl.cell.read_only import EMPTY_CELL
 from openpyxl.utils import datetime as opxl_dt
-from pycel.excelutil import AddressCell, AddressRange, MAX_ROW
+from pycel.excelutil import (
+    AddressCell,
+    AddressRange,
+    ERROR_CODES,
+    ExcelError,
+    MAX_ROW,
+    RangeIndex,
+)
 
 ARRAY_FORMULA_FORMAT = '=INDEX(%s,%s,%s,%s,%s)'
 
@@ -67,10 +74,16 @@ class _OpxRange(ExcelWrapper.RangeData):
     def __new__(cls, cells, cells_dataonly, address):
         formulas = tuple(tuple(cls.cell_to_formula(cell) for cell in row)
                          for row in cells)
-        values = tuple(tuple(cell.value for cell in row)
+        values = tuple(tuple(cls.cell_to_value(cell) for cell in row)
                        for row in cells_dataonly)
         return ExcelWrapper.RangeData(address, formulas, values)
 
+    @classmethod
+    def cell_to_value(cls, cell):
+        if cell.data_type == 'e' and cell.value in ERROR_CODES:
+            return ExcelError(cell.value)
+        return cell.value
+
     @classmethod
     def cell_to_formula(cls, cell):
         if cell.value is None:
@@ -87,7 +100,8 @@ class _OpxCell(_OpxRange):
     def __new__(cls, cell, cell_dataonly, address):
         assert isinstance(address, AddressCell)
         return ExcelWrapper.RangeData(
-            address, cls.cell_to_formula(cell), cell_dataonly.value)
+            address, cls.cell_to_formula(cell),
+            cls.cell_to_value(cell_dataonly))
 
 
 class ExcelOpxWrapper(ExcelWrapper):
@@ -99,7 +113,7 @@ class ExcelOpxWrapper(ExcelWrapper):
         self.filename = os.path.abspath(filename)
         self._defined_names = None
         self._tables = None
-        self._table_refs = {}
+        self._table_index = None
         self.workbook = None
         self.workbook_dataonly = None
 
@@ -134,13 +148,14 @@ class ExcelOpxWrapper(ExcelWrapper):
     def table_name_containing(self, address):
         """ Return the table name containing the address given """
         address = AddressCell(address)
-        if address not in self._table_refs:
-            for t in self.workbook[address.sheet]._tables:
-                if address in AddressRange(t.ref):
-                    self._table_refs[address] = t.name.lower()
-                    break
-
-        return self._table_refs.get(address)
+        if self._table_index is None:
+            self._table_index = RangeIndex()
+            for ws in self.workbook:
+                for t in ws._tables:
+                    self._table_index.add(
+                        AddressRange(t.ref, sheet=ws.title), t.name.lower())
+
+        return next(iter(self._table_index.containing(address)), None)
 
     def connect(self):
         self.workbook = load_workbook(self.filename)
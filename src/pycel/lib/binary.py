@@ -4,7 +4,7 @@ Python equivalents of binary base number excel functions (hex2dec, etc.)
 
 import functools
 
-from pycel.excelutil import flatten, ERROR_CODES, EMPTY, VALUE_ERROR, NUM_ERROR
+from pycel.excelutil import flatten, EMPTY, is_error, VALUE_ERROR, NUM_ERROR
 
 _SIZE_MASK = {2: 512, 8: 0x20000000, 16: 0x8000000000}
 _BASE_TO_FUNC = {2: bin, 8: oct, 16: hex}
@@ -16,7 +16,7 @@ def _base2dec(value, base):
         return VALUE_ERROR
 
     value = value[0]
-    if value in ERROR_CODES:
+    if is_error(value):
         return value
 
     if value in (None, EMPTY):
@@ -41,7 +41,7 @@ def _dec2base(value, places=None, base=16):
         return VALUE_ERROR
 
     value = value[0]
-    if value in ERROR_CODES:
+    if is_error(value):
         return value
 
     if value in (None, EMPTY):
@@ -0,0 +1,140 @@
+"""
+Traits of the python functions which implement excel functions
+
+Optimizations (sharing calls, folding constants, memoizing results,
+scheduling) use these to decide what can safely be done with a call.
+"""
+import collections
+import math
+
+# pure: the result depends only on the arguments
+# volatile: the result can change on every evaluation (NOW, RAND, ...)
+# arrays: accepts ranges or arrays as arguments
+# vectorized: large range arguments are reduced with numpy
+# lazy: index of the first argument passed as a thunk, else None
+# array_result: can return an array instead of a single value
+# empty_result: can return the value of an empty cell (None), which a
+#   cell holding the result would turn into 0
+FunctionTraits = collections.namedtuple(
+    'FunctionTraits',
+    'pure volatile arrays vectorized lazy array_result empty_result')
+
+
+def _traits(pure=True, volatile=False, arrays=False, vectorized=False,
+            lazy=None, array_result=False, empty_result=False):
+    return FunctionTraits(pure, volatile, arrays, vectorized, lazy,
+                          array_result, empty_result)
+
+
+SCALAR = _traits()
+RANGES = _traits(arrays=True)
+LOOKUP = _traits(arrays=True, empty_result=True)
+VECTORIZED = _traits(arrays=True, vectorized=True)
+
+# traits for functions which are not listed, or not implemented
+UNKNOWN = _traits(pure=False)
+
+# python function name -> traits
+function_traits_data = {
+    'average': VECTORIZED,
+    'averageif': VECTORIZED,
+    'averageifs': VECTORIZED,
+    'choose': _traits(lazy=1, empty_result=True),
+    'column': _traits(array_result=True),
+    'concat': RANGES,
+    'concatenate': SCALAR,
+    'count': VECTORIZED,
+    'countif': VECTORIZED,
+    'countifs': VECTORIZED,
+    'date': SCALAR,
+    'forecast': RANGES,
+    'growth': _traits(arrays=True, array_result=True),
+    'hlookup': LOOKUP,
+    'index': _traits(arrays=True, array_result=True, empty_result=True),
+    'isNa': SCALAR,
+    'istext': SCALAR,
+    'linest': _traits(arrays=True, array_result=True),
+    'lookup': LOOKUP,
+    'match': RANGES,
+    'mid': SCALAR,
+    'mmult': _traits(arrays=True, array_result=True),
+    'mod': SCALAR,
+    'npv': RANGES,
+    'power': SCALAR,
+    'right': SCALAR,
+    'roundup': SCALAR,
+    'row': _traits(array_result=True),
+    'sumif': VECTORIZED,
+    'sumifs': VECTORIZED,
+    'sumproduct': VECTORIZED,
+    'transpose': _traits(arrays=True, array_result=True),
+    'trend': _traits(arrays=True, array_result=True),
+    'value': SCALAR,
+    'vlookup': LOOKUP,
+    'xatan2': SCALAR,
+    'xlen': SCALAR,
+    'xlog': SCALAR,
+    'xmax': VECTORIZED,
+    'xmin': VECTORIZED,
+    'xround': SCALAR,
+    'xsum': VECTORIZED,
+    'yearfrac': SCALAR,
+
+    # lib.logical
+    'iferror': _traits(lazy=1, empty_result=True),
+    'x_and': RANGES,
+    'x_if': _traits(lazy=1, empty_result=True),
+    'x_not': SCALAR,
+    'x_or': RANGES,
+    'x_xor': RANGES,
+
+    # lib.binary
+    'bin2dec': SCALAR,
+    'bin2hex': SCALAR,
+    'bin2oct': SCALAR,
+    'dec2bin': SCALAR,
+    'dec2hex': SCALAR,
+    'dec2oct': SCALAR,
+    'hex2bin': SCALAR,
+    'hex2dec': SCALAR,
+    'hex2oct': SCALAR,
+    'oct2bin': SCALAR,
+    'oct2dec': SCALAR,
+    'oct2hex': SCALAR,
+
+    # builtins in the evaluation name space
+    'abs': SCALAR,
+    'int': SCALAR,
+    'round': SCALAR,
+
+    # volatile excel functions, (not yet implemented)
+    'cell': _traits(pure=False, volatile=True),
+    'indirect': _traits(pure=False, volatile=True),
+    'info': _traits(pure=False, volatile=True),
+    'now': _traits(pure=False, volatile=True),
+    'offset': _traits(pure=False, volatile=True),
+    'rand': _traits(pure=False, volatile=True),
+    'randarray': _traits(pure=False, volatile=True, array_result=True),
+    'randbetween': _traits(pure=False, volatile=True),
+    'today': _traits(pure=False, volatile=True),
+}
+
+
+def function_traits(name):
+    """ The traits of a python function name used in compiled formulas """
+    traits = function_traits_data.get(name)
+    if traits is None:
+        # the math module functions are pure and scalar
+        is_math = isinstance(name, str) and callable(getattr(math, name, None))
+        traits = SCALAR if is_math else UNKNOWN
+    return traits
+
+
+# functions whose result depends only on their arguments, which reduce
+# ranges to a single value, so identical calls are worth sharing.  Not
+# those which can return an empty cell, since the shared cell gives 0.
+shared_call_functions = frozenset(
+    name for name, traits in function_traits_data.items()
+    if traits.pure and traits.arrays and not traits.array_result and
+    traits.lazy is None and not traits.empty_result
+)
@@ -2,13 +2,18 @@
 Python equivalents of excel logical functions (bools)
 """
 
-from pycel.excelutil import flatten, ERROR_CODES, VALUE_ERROR
+from pycel.excelutil import (
+    flatten,
+    is_error,
+    resolve_thunk,
+    VALUE_ERROR,
+)
 
 
 def _clean_logical(test):
     """For logicals that take one argument, clean via excel rules"""
 
-    if test in ERROR_CODES:
+    if is_error(test):
         return test
 
     if isinstance(test, str):
@@ -30,7 +35,7 @@ def _clean_logicals(*args):
 
     values = tuple(flatten(args))
 
-    error = next((x for x in values if x in ERROR_CODES), None)
+    error = next((x for x in values if is_error(x)), None)
 
     if error is not None:
         # return the first error in the list
@@ -63,14 +68,15 @@ def x_if(test, true_value, false_value=0):
         # return error code
         return test
     else:
-        return true_value if test else false_value
+        # only evaluate the branch which was selected
+        return resolve_thunk(true_value if test else false_value)
 
 
 def iferror(arg, value_if_error):
     # Excel reference: https://support.office.com/en-us/article/
     #   IFERROR-function-C526FD07-CAEB-47B8-8BB6-63F3E417F611
 
-    return value_if_error if arg in ERROR_CODES else arg
+    return resolve_thunk(value_if_error) if is_error(arg) else arg
 
 
 # IFNA function
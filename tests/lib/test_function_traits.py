@@ -0,0 +1,48 @@
+import importlib
+import inspect
+
+import pytest
+
+from pycel.lib.function_traits import (
+    function_traits,
+    function_traits_data,
+    shared_call_functions,
+    UNKNOWN,
+)
+
+
+@pytest.mark.parametrize(
+    'module', ('pycel.excellib', 'pycel.lib.binary', 'pycel.lib.logical'))
+def test_all_functions_have_traits(module):
+    module = importlib.import_module(module)
+    for name, func in inspect.getmembers(module, callable):
+        if not name.startswith('_') and not inspect.isclass(func) and \
+                getattr(func, '__module__', module.__name__) == \
+                module.__name__ and not name.endswith('_unwrapped'):
+            assert name in function_traits_data, name
+
+
+@pytest.mark.parametrize(
+    'name, pure, volatile, arrays, lazy, array_result', (
+        ('xsum', True, False, True, None, False),
+        ('x_if', True, False, False, 1, False),
+        ('index', True, False, True, None, True),
+        ('sin', True, False, False, None, False),
+        ('now', False, True, False, None, False),
+        ('not_a_function', False, False, False, None, False),
+        (None, False, False, False, None, False),
+    )
+)
+def test_function_traits(name, pure, volatile, arrays, lazy, array_result):
+    traits = function_traits(name)
+    assert (pure, volatile, arrays, lazy, array_result) == (
+        traits.pure, traits.volatile, traits.arrays, traits.lazy,
+        traits.array_result)
+
+
+def test_derived_sets():
+    assert UNKNOWN == function_traits('xyzzy')
+
+    assert {'sumifs', 'match', 'xsum', 'count'} < shared_call_functions
+    assert not {'choose', 'index', 'x_if', 'mid'} & shared_call_functions
+    assert not {'vlookup', 'hlookup', 'lookup'} & shared_call_functions
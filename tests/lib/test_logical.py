@@ -59,6 +59,16 @@ def test_iferror():
 
     for error in ERROR_CODES:
         assert 2 == iferror(error, 2)
+        assert 2 == iferror(error, lambda: 2)
+
+    def not_called():
+        raise AssertionError('should not be evaluated')
+
+    assert 'A' == iferror('A', not_called)
+
+    # text which looks like an error code is not an error
+    assert '#N/A' == iferror('#N/A', 2)
+    assert 2 == iferror(NA_ERROR, 2)
 
 
 @pytest.mark.parametrize(
@@ -82,6 +92,15 @@ def test_x_if(test_value, true_value, false_value, result):
     assert x_if(test_value, true_value, false_value) == result
 
 
+def test_x_if_lazy():
+    def not_called():
+        raise AssertionError('should not be evaluated')
+
+    assert 2 == x_if(True, lambda: 2, not_called)
+    assert 1 == x_if(False, not_called, lambda: 1)
+    assert NA_ERROR == x_if(NA_ERROR, not_called, not_called)
+
+
 @pytest.mark.parametrize(
     'result, test_value', (
         (False, True),
@@ -1,12 +1,26 @@
+import itertools
 import json
 import os
 import shutil
 from unittest import mock
 
 import pytest
-from pycel.excelcompiler import _Cell, _CellRange, ExcelCompiler
-from pycel.excelformula import FormulaParserError, UnknownFunction
-from pycel.excelutil import AddressCell, AddressRange, flatten
+from pycel.excelcompiler import (
+    _Cell,
+    _CellRange,
+    _ColumnTotals,
+    _VectorRun,
+    ExcelCompiler,
+)
+from pycel.excelformula import ExcelFormula, FormulaParserError, UnknownFunction
+from pycel.excelutil import (
+    AddressCell,
+    AddressRange,
+    DIV0,
+    flatten,
+    NA_ERROR,
+    RangeValue,
+)
 from pycel.excelwrapper import ExcelWrapper
 
 
@@ -67,6 +81,18 @@ def test_round_trip_through_json_yaml_and_pickle(
     assert -0.00331 == round(excel_compiler.evaluate('Sheet1!D1'), 5)
 
 
+def test_error_values_round_trip(excel_compiler):
+    excel_compiler.evaluate('Sheet1!D1')
+    excel_compiler.set_value('Sheet1!A1', '#N/A')
+    assert excel_compiler.evaluate('Sheet1!A1') is NA_ERROR
+
+    for file_type in ('yml', 'json'):
+        excel_compiler.to_file(file_types=(file_type, ))
+        loaded = ExcelCompiler.from_file(
+            '{}.{}'.format(excel_compiler.filename, file_type))
+        assert loaded.evaluate('Sheet1!A1') is NA_ERROR
+
+
 def test_filename_ext(excel_compiler, fixture_xls_path):
     excel_compiler.evaluate('Sheet1!D1')
     excel_compiler.extra_data = {1: 3}
@@ -165,6 +191,29 @@ def test_recalculate(excel_compiler):
     assert -0.02286 == round(excel_compiler.cell_map[out_address].value, 5)
 
 
+def test_recalculate_constant_ranges(excel_compiler):
+    assert 6 == excel_compiler.evaluate('Sheet1!B1')
+    constant = excel_compiler.evaluate('Sheet1!A1:A3')
+    formulas = excel_compiler.evaluate('Sheet1!A1:B3')
+    assert excel_compiler._is_constant_range(
+        excel_compiler.cell_map['Sheet1!A1:A3'])
+    assert not excel_compiler._is_constant_range(
+        excel_compiler.cell_map['Sheet1!A1:B3'])
+
+    # the constant range keeps its value, the other is rebuilt
+    excel_compiler.recalculate()
+    assert constant is excel_compiler.cell_map['Sheet1!A1:A3'].value
+    assert formulas is not excel_compiler.cell_map['Sheet1!A1:B3'].value
+    assert formulas == excel_compiler.cell_map['Sheet1!A1:B3'].value
+
+    # setting a cell still resets the constant range
+    excel_compiler.set_value('Sheet1!A2', 10)
+    assert ((1, ), (10, ), (3, )) == excel_compiler.evaluate('Sheet1!A1:A3')
+    assert 14 == excel_compiler.evaluate('Sheet1!B1')
+    excel_compiler.recalculate()
+    assert 14 == excel_compiler.evaluate('Sheet1!B1')
+
+
 def test_evaluate_from_generator(excel_compiler):
     result = excel_compiler.evaluate(
         a for a in ('trim-range!B1', 'trim-range!B2'))
@@ -200,6 +249,262 @@ def test_gen_graph(excel_compiler):
         excel_compiler._gen_graph(None)
 
 
+def test_evaluate_bound_references(excel_compiler):
+    out_address = 'trim-range!B2'
+    assert 136 == excel_compiler.evaluate(out_address)
+
+    # precedents already evaluated are read directly from the bound cells
+    excel_compiler.cell_map[out_address].value = None
+    with mock.patch.object(excel_compiler, '_evaluate',
+                           wraps=excel_compiler._evaluate) as evaluate, \
+            mock.patch.object(excel_compiler, '_evaluate_range') as ev_range:
+        assert 136 == excel_compiler.evaluate(out_address)
+    assert 1 == evaluate.call_count
+    assert 0 == ev_range.call_count
+
+    # and evaluated through the compiler otherwise
+    excel_compiler.set_value('trim-range!D4', 5)
+    assert 137 == excel_compiler.evaluate(out_address)
+
+
+def test_memoize_functions(excel_compiler):
+    memoized = excel_compiler.memoize_functions(
+        ('xsum', 'linest', 'x_if', 'xyzzy'))
+    assert {'xsum', 'linest'} == set(memoized)
+    assert memoized == excel_compiler.memoize_functions(('xsum', 'linest'))
+    xsum = memoized['xsum']
+
+    out_address = 'trim-range!B1'
+    assert 24 == excel_compiler.evaluate(out_address)
+    excel_compiler.cell_map[out_address].value = None
+    assert 24 == excel_compiler.evaluate(out_address)
+    assert (0, 1) == (xsum.hits, xsum.misses)
+
+    # same range value, so the cached result
+    excel_compiler.cell_map[out_address].value = None
+    assert 24 == excel_compiler.evaluate(out_address)
+    assert (1, 1) == (xsum.hits, xsum.misses)
+    assert 0.5 == xsum.hit_rate
+
+    # a reset range is a new argument
+    excel_compiler.set_value('trim-range!D1', 5)
+    assert 28 == excel_compiler.evaluate(out_address)
+    assert (1, 2) == (xsum.hits, xsum.misses)
+
+    # keyword arguments are not cached
+    excel_compiler.evaluate('Sheet1!D1')
+    excel_compiler.cell_map['Sheet1!D1'].value = None
+    assert -0.02286 == round(excel_compiler.evaluate('Sheet1!D1'), 5)
+    assert (0, 0) == (memoized['linest'].hits, memoized['linest'].misses)
+
+    assert 'xmax' in excel_compiler.memoize_functions()
+
+
+@pytest.mark.parametrize(
+    'python_code', (
+        '_C_("A1") + _C_("B1")',
+        '_C_("A1") - _C_("B1")',
+        '_C_("A1") * _C_("B1")',
+        '_C_("A1") / _C_("B1")',
+        '-_C_("A1") * _C_("B1")',
+        '(_C_("A1") * 2) - (_C_("B1") / 4)',
+        '(_C_("A1") * -0.5) * _C_("B1")',
+        '1 / (_C_("A1") / _C_("B1"))',
+        '-(_C_("A1") - _C_("A1"))',
+    )
+)
+def test_vector_run_evaluate(python_code):
+    template, refs = _VectorRun.parse(python_code)
+    run = _VectorRun(template, [None], {None: refs})
+
+    values = (0, 1, -3, 2.5, 3.0, -0.0, 0.1, 2 ** 60, 1e300, 'abc', '2',
+              None, True, DIV0)
+    inputs = list(itertools.product(values, repeat=len(set(refs))))
+    inputs = [tuple(dict(zip(('A1', 'B1'), row))[ref] for ref in refs)
+              for row in inputs]
+
+    formula = ExcelFormula('=' + python_code, formula_is_python_code=True)
+    for row, result in zip(inputs, run.evaluate(inputs)):
+        if result is not None:
+            values = dict(zip(refs, row))
+            eval_ctx = ExcelFormula.build_eval_context(values.get, None)
+            formula.compiled_lambda = None
+            expected = eval_ctx(formula)
+            assert (expected, type(expected)) == (result, type(result)), row
+            assert repr(expected) == repr(result)
+
+    # only rows of reasonable numbers are vectorized
+    assert sum(result is not None for result in run.evaluate(inputs)) > \
+        len(inputs) // 8
+
+
+@pytest.mark.parametrize(
+    'python_code', (
+        '_C_("A1")',
+        '1 + 2',
+        '_C_("A1") + _R_("B1:B2")',
+        '_C_("A1") ** 2',
+        '_C_("A1") + pi',
+        '_C_("A1") + True',
+        '_C_("A1") & "a"',
+        '_C_("A1") > 1',
+        'xsum(_C_("A1"), 1)',
+        '_C_("A1") + 1e300',
+        '_C_("A1") +',
+    )
+)
+def test_vector_run_parse_not_vectorizable(python_code):
+    assert _VectorRun.parse(python_code) is None
+
+
+def test_vectorize_filled_columns(excel_compiler):
+    excel_compiler.evaluate('Sheet1!B18')
+
+    def add_formulas(column, fmt):
+        for row in range(1, 19):
+            address = AddressCell('Sheet1!{}{}'.format(column, row))
+            cell = _Cell(address, None, '=' + fmt.format(
+                row=row, prev='G{}'.format(row - 1) if row > 1 else 'A1'),
+                None)
+            excel_compiler.cell_map[address.address] = cell
+            excel_compiler.dep_graph.add_node(cell)
+            excel_compiler.graph_todos.append(cell)
+
+    add_formulas('E', '(_C_("Sheet1!A{row}") * 2) + '
+                      '(_C_("Sheet1!B{row}") / _C_("Sheet1!A{row}"))')
+    add_formulas('F', '_C_("Sheet1!E{row}") - _C_("Sheet1!A{row}")')
+    add_formulas('G', '_C_("Sheet1!A{row}") + _C_("Sheet1!{prev}")')
+    add_formulas('H', '_C_("Sheet1!A{row}") * (_C_("Sheet1!F{row}") + 1)')
+    excel_compiler._process_gen_graph()
+
+    # a string, and a zero divisor, are evaluated by the formulas
+    excel_compiler.set_value('Sheet1!A3', 'abc')
+    excel_compiler.set_value('Sheet1!A5', 0)
+
+    addrs = ['Sheet1!{}{}'.format(col, row)
+             for col in 'EFGH' for row in range(1, 19)]
+    expected = excel_compiler.evaluate(addrs)
+
+    assert [AddressRange('Sheet1!E1:E18'), AddressRange('Sheet1!F1:F18'),
+            AddressRange('Sheet1!H1:H18')] == sorted(
+        excel_compiler.vectorize_filled_columns(),
+        key=lambda a: a.sort_key)
+
+    with mock.patch.object(excel_compiler, '_evaluate_formula',
+                           wraps=excel_compiler._evaluate_formula) as formula:
+        excel_compiler.recalculate()
+        assert expected == excel_compiler.evaluate(addrs)
+    assert {'Sheet1!E3', 'Sheet1!F3', 'Sheet1!H3',
+            'Sheet1!E5', 'Sheet1!F5', 'Sheet1!H5'} == {
+        call[0][0].address.address for call in formula.call_args_list
+        if call[0][0].address.column in 'EFH'}
+
+    excel_compiler.set_value('Sheet1!A3', 3)
+    assert 6 + excel_compiler.evaluate('Sheet1!B3') / 3 == \
+        excel_compiler.evaluate('Sheet1!E3')
+
+
+@pytest.mark.parametrize(
+    'python_code, expected', (
+        ('xsum(_R_("Sheet1!B2:B5"))', ('xsum', 'Sheet1!B2:B5')),
+        ('count(_R_("Sheet1!B2:B5"))', ('count', 'Sheet1!B2:B5')),
+        ('average(_R_("s!B2:B5"))', ('average', 's!B2:B5')),
+        ('xsum(_R_("Sheet1!B2:C5"))', None),
+        ('xsum(_R_("Sheet1!B:B"))', None),
+        ('xsum(_C_("Sheet1!B2"))', None),
+        ('xsum(_R_("Sheet1!B2:B5"), 1)', None),
+        ('xmax(_R_("Sheet1!B2:B5"))', None),
+        ('xsum(_R_("Sheet1!B2:B5")) + 1', None),
+    )
+)
+def test_column_totals_parse(python_code, expected):
+    parsed = _ColumnTotals.parse(python_code)
+    if expected is None:
+        assert parsed is None
+    else:
+        assert (expected[0], AddressRange(expected[1])) == parsed
+
+
+def test_total_columns(excel_compiler):
+    excel_compiler.evaluate('Sheet1!A18')
+
+    def add_formulas(column, fmt):
+        for row in range(2, 19):
+            address = AddressCell('Sheet1!{}{}'.format(column, row))
+            cell = _Cell(address, None, '=' + fmt.format(
+                row=row, start=max(1, row - 3), next=row + 1), None)
+            excel_compiler.cell_map[address.address] = cell
+            excel_compiler.dep_graph.add_node(cell)
+            excel_compiler.graph_todos.append(cell)
+
+    add_formulas('E', 'xsum(_R_("Sheet1!A1:A{row}"))')
+    add_formulas('F', 'count(_R_("Sheet1!A{start}:A{row}"))')
+    add_formulas('G', 'average(_R_("Sheet1!A{start}:A{row}"))')
+    add_formulas('H', 'xsum(_R_("Sheet1!E2:E{row}"))')
+    add_formulas('I', 'xsum(_R_("Sheet1!I{next}:I20"))')
+    excel_compiler._process_gen_graph()
+
+    # strings, even numeric, are skipped, and an error is the total of the
+    # ranges with it
+    excel_compiler.set_value('Sheet1!A3', 'abc')
+    excel_compiler.set_value('Sheet1!A5', '5')
+    excel_compiler.set_value('Sheet1!A9', 2.5)
+    excel_compiler.set_value('Sheet1!A12', DIV0)
+
+    addrs = ['Sheet1!{}{}'.format(col, row)
+             for col in 'EFGH' for row in range(2, 19)]
+    expected = excel_compiler.evaluate(addrs)
+
+    # the column I has the formulas, so is not totaled
+    assert [AddressRange('Sheet1!A1:A18'), AddressRange('Sheet1!E2:E18')] == \
+        sorted(excel_compiler.total_columns(), key=lambda a: a.sort_key)
+
+    with mock.patch.object(excel_compiler, '_evaluate_formula',
+                           wraps=excel_compiler._evaluate_formula) as formula:
+        excel_compiler.recalculate()
+        result = excel_compiler.evaluate(addrs)
+    assert expected == result
+    assert [type(x) for x in expected] == [type(x) for x in result]
+    # a one cell range is not a range, so is evaluated by its formula, as
+    # are the totals with the float in A9 and before the error in A12
+    assert {'Sheet1!H2'} | {'Sheet1!{}{}'.format(col, row)
+                            for col in 'EGH' for row in (9, 10, 11)} == {
+        call[0][0].address.address for call in formula.call_args_list
+        if call[0][0].address.column in 'EFGH'}
+
+    excel_compiler.set_value('Sheet1!A12', 12)
+    assert excel_compiler.evaluate('Sheet1!E18') == sum(
+        excel_compiler.evaluate('Sheet1!A{}'.format(row))
+        for row in range(1, 19) if row not in (3, 5))
+    assert (11 + 12 + 13 + 14) / 4 == excel_compiler.evaluate('Sheet1!G14')
+
+
+def test_total_columns_floats(excel_compiler):
+    excel_compiler.evaluate('Sheet1!A18')
+
+    for row in range(1, 12):
+        address = AddressCell('Sheet1!E{}'.format(row))
+        cell = _Cell(address, None, '=xsum(_R_("Sheet1!A{}:A{}"))'.format(
+            row, row + 1), None)
+        excel_compiler.cell_map[address.address] = cell
+        excel_compiler.dep_graph.add_node(cell)
+        excel_compiler.graph_todos.append(cell)
+    excel_compiler._process_gen_graph()
+
+    for row in range(1, 13):
+        excel_compiler.set_value(
+            'Sheet1!A{}'.format(row), 1e15 if row == 1 else 0.1)
+
+    addrs = ['Sheet1!E{}'.format(row) for row in range(1, 12)]
+    expected = excel_compiler.evaluate(addrs)
+    assert [0.2] * 10 == expected[1:]
+
+    # the prefix sums of the column cancel the 0.1s against the 1e15
+    assert [AddressRange('Sheet1!A1:A12')] == excel_compiler.total_columns()
+    excel_compiler.recalculate()
+    assert expected == excel_compiler.evaluate(addrs)
+
+
 def test_value_tree_str(excel_compiler):
     out_address = 'trim-range!B2'
     excel_compiler.evaluate(out_address)
@@ -259,6 +564,88 @@ def test_trim_cells_range(excel_compiler):
     assert old_value - 1 == excel_compiler.evaluate(output_addrs[0])
 
 
+def test_eliminate_common_subexpressions(excel_compiler):
+    output_addrs = ('trim-range!A1', 'trim-range!A2', 'trim-range!B2')
+    excel_compiler._gen_graph(output_addrs)
+    excel_compiler.recalculate()
+    assert (24, 136, 136) == excel_compiler.evaluate(output_addrs)
+
+    assert {
+        'xsum(_R_("trim-range!D1:E3"))': 2,
+        'xsum(_R_("trim-range!D4:E4"))': 2,
+    } == excel_compiler.eliminate_common_subexpressions()
+    assert {} == excel_compiler.eliminate_common_subexpressions()
+
+    shared = {cell.python_code: addr
+              for addr, cell in excel_compiler.cell_map.items()
+              if addr.startswith('_CSE_!')}
+    assert 2 == len(shared)
+    assert excel_compiler.cell_map['trim-range!A1'].python_code == \
+        '_C_("{}")'.format(shared['xsum(_R_("trim-range!D1:E3"))'])
+    assert excel_compiler.cell_map['trim-range!B2'].python_code == \
+        '(_C_("trim-range!B1") + _C_("{}")) + _C_("trim-range!D5")'.format(
+            shared['xsum(_R_("trim-range!D4:E4"))'])
+
+    # the shared cells are reset by their precedents
+    excel_compiler.set_value('trim-range!D4', 5)
+    assert (24, 137, 137) == excel_compiler.evaluate(output_addrs)
+    excel_compiler.set_value('trim-range!D1', 2)
+    assert (25, 138, 138) == excel_compiler.evaluate(output_addrs)
+
+    excel_compiler._to_text()
+    excel_compiler = ExcelCompiler._from_text(excel_compiler.filename)
+    assert (25, 138, 138) == excel_compiler.evaluate(output_addrs)
+    excel_compiler.set_value('trim-range!E4', 9)
+    assert (25, 139, 139) == excel_compiler.evaluate(output_addrs)
+
+
+def test_eliminate_common_subexpressions_nested(excel_compiler):
+    for addr, formula in (
+            ('Sheet1!E1', '=xsum(_R_("Sheet1!A1:A3")) + 1'),
+            ('Sheet1!E2', '=xmax(xsum(_R_("Sheet1!A1:A3")), _C_("Sheet1!B1"))'),
+            ('Sheet1!E3', '=xmax(xsum(_R_("Sheet1!A1:A3")), _C_("Sheet1!B1"))'),
+            ('Sheet1!E4', '=xmin(_C_("Sheet1!A1"), x_if(1, 2, 3))'),
+            ('Sheet1!E5', '=xmin(_C_("Sheet1!A1"), x_if(1, 2, 3))'),
+    ):
+        address = AddressCell(addr)
+        excel_compiler.cell_map[str(address)] = _Cell(
+            address, None, formula, None)
+        excel_compiler.dep_graph.add_node(excel_compiler.cell_map[addr])
+        excel_compiler.graph_todos.append(excel_compiler.cell_map[addr])
+    excel_compiler._process_gen_graph()
+    expected = excel_compiler.evaluate(['Sheet1!E1', 'Sheet1!E2'])
+    a1 = excel_compiler.evaluate('Sheet1!A1')
+
+    # only pure functions are shared, and calls inside shared calls are
+    # counted once, (Sheet1!B1 is also: =SUM(A1:A3))
+    assert {
+        'xmax(xsum(_R_("Sheet1!A1:A3")), _C_("Sheet1!B1"))': 2,
+        'xsum(_R_("Sheet1!A1:A3"))': 3,
+    } == excel_compiler.eliminate_common_subexpressions()
+    assert expected == excel_compiler.evaluate(['Sheet1!E1', 'Sheet1!E2'])
+
+    excel_compiler.set_value('Sheet1!A1', a1 + 5)
+    assert expected[0] + 5 == excel_compiler.evaluate('Sheet1!E1')
+
+
+def test_eliminate_common_subexpressions_empty_lookup(excel_compiler):
+    for addr in ('Sheet1!E1', 'Sheet1!E2'):
+        address = AddressCell(addr)
+        excel_compiler.cell_map[addr] = _Cell(
+            address, None,
+            '=vlookup("k", _R_("Sheet1!J1:K2"), 2, 0) & "x"', None)
+        excel_compiler.dep_graph.add_node(excel_compiler.cell_map[addr])
+        excel_compiler.graph_todos.append(excel_compiler.cell_map[addr])
+    excel_compiler._process_gen_graph()
+    excel_compiler.set_value('Sheet1!J1', 'k')
+    assert ['x', 'x'] == excel_compiler.evaluate(['Sheet1!E1', 'Sheet1!E2'])
+
+    # the lookup can give an empty cell, which a shared cell would make 0
+    assert {} == excel_compiler.eliminate_common_subexpressions()
+    excel_compiler.recalculate()
+    assert ['x', 'x'] == excel_compiler.evaluate(['Sheet1!E1', 'Sheet1!E2'])
+
+
 def test_evaluate_from_non_cells(excel_compiler):
     input_addrs = ['Sheet1!A11']
     output_addrs = ['Sheet1!A11:A13', 'Sheet1!D1', 'Sheet1!B11', ]
@@ -320,6 +707,25 @@ def test_validate_calcs_excel_compiler(excel_compiler):
     assert msg == '{}'
 
 
+def test_evaluate_overlapping_ranges(excel_compiler):
+    first = excel_compiler.evaluate('Sheet1!A1:B5')
+    second = excel_compiler.evaluate('Sheet1!A2:B6')
+    assert first[1:] == second[:-1]
+    assert all(a is b for a, b in zip(first[1:], second))
+
+    # a different span of columns does not share the rows
+    third = excel_compiler.evaluate('Sheet1!A1:A5')
+    assert tuple(row[:1] for row in first) == third
+
+    excel_compiler.set_value('Sheet1!A3', 'xyzzy')
+    first_reset = excel_compiler.evaluate('Sheet1!A1:B5')
+    second_reset = excel_compiler.evaluate('Sheet1!A2:B6')
+    assert 'xyzzy' == first_reset[2][0] == second_reset[1][0]
+    assert 'xyzzy' == excel_compiler.evaluate('Sheet1!A1:A5')[2][0]
+    assert all(a is b for a, b in zip(first_reset[3:], first[3:]))
+    assert first_reset[2] is second_reset[1]
+
+
 def test_evaluate_entire_row_column(excel_compiler):
 
     value = excel_compiler.evaluate(AddressRange('Sheet1!A:B'))
@@ -329,6 +735,9 @@ def test_evaluate_entire_row_column(excel_compiler):
     value = excel_compiler.evaluate(AddressRange('Sheet1!1:2'))
     expected = excel_compiler.evaluate(AddressRange('Sheet1!A1:D2'))
     assert value == expected
+    assert isinstance(value, RangeValue)
+    assert (2, 4) == value.shape
+    assert value.flat == tuple(flatten(expected))
 
     # now from the text based file
     excel_compiler._to_text()
@@ -13,7 +13,8 @@ from pycel.excelformula import (
     Token,
     UnknownFunction,
 )
-from pycel.excelutil import DIV0, NAME_ERROR, VALUE_ERROR
+from pycel.excelutil import (
+    DIV0, is_error, NA_ERROR, NAME_ERROR, VALUE_ERROR)
 from test_excelutil import ATestCell
 
 
@@ -184,7 +185,8 @@ if_inputs = [
         '   "  more ""test"" text"',
         '"a"|"a"|"b"|ARRAYROW|"c"|#N/A|ARRAYROW|1|-|TRUE|ARRAYROW|ARRAY|=|'
         '"yes"|"no"|IF|"  more ""test"" text"|&',
-        'x_if("a" == [["a", "b"], ["c", "#N/A"], [-1, True]], "yes", "no")'
+        'x_if("a" == [["a", "b"], ["c", ExcelError("#N/A")], [-1, True]],'
+        ' "yes", "no")'
         ' & "  more \\"test\\" text"'),
     FormulaTest(
         '=IF(R13C3>DATE(2002,1,6),0,IF(ISERROR(R[41]C[2]),0,IF(R13C3>=R[41]C[2]'
@@ -295,6 +297,11 @@ linest_inputs = [
         'linest(b32:(index(_R_("B32:B119"), match(0, _R_("B32:B119"), -1), 1)),'
         ' f32:(index(_R_("B32:F119"), match(0, _R_("B32:B119"), -1), 5)), '
         'degree=-1)[-2]'),
+    FormulaTest(
+        '=INDEX(LINEST(X5:X32,W5:W32^{1,2,3}),1,2,1,4)',
+        'X5:X32|W5:W32|1|2|3|ARRAYROW|ARRAY|^|LINEST|1|2|1|4|INDEX',
+        'index(linest(_R_("X5:X32"), _R_("W5:W32") ** [1, 2, 3]), '
+        '1, 2, 1, 4)'),
     FormulaTest(
         '=LINESTMARIO(G2:G17,E2:E17,FALSE)',
         'G2:G17|E2:E17|FALSE|LINESTMARIO',
@@ -413,13 +420,13 @@ def test_table_relative_address():
     cell = ATestCell('A', 1, sheet='s')
 
     excel_formula = ExcelFormula('=junk')
-    assert '"#NAME?"' == excel_formula.ast.emit
+    assert 'ExcelError("#NAME?")' == excel_formula.ast.emit
 
     excel_formula = ExcelFormula('=junk', cell=cell)
-    assert '"#NAME?"' == excel_formula.ast.emit
+    assert 'ExcelError("#NAME?")' == excel_formula.ast.emit
 
     excel_formula = ExcelFormula('=[col1]', cell=cell)
-    assert '"#NAME?"' == excel_formula.ast.emit
+    assert 'ExcelError("#NAME?")' == excel_formula.ast.emit
 
     with mock.patch.object(cell, 'excel') as excel, \
             mock.patch.object(excel, 'table') as get_table, \
@@ -487,6 +494,35 @@ def test_if_args_error():
     assert VALUE_ERROR == eval_context(ExcelFormula('=if(0,1,#VALUE!)'))
 
 
+@pytest.mark.parametrize(
+    'result, evaluated, formula', (
+        (2, {'A1'}, '=IF(TRUE, A1 * 2, B1 / 0)'),
+        (0.5, {'B1'}, '=IF(FALSE, A1 * 2, B1 / 2)'),
+        (VALUE_ERROR, {'D1'}, '=IF(D1, A1, B1)'),
+        (1, {'A1'}, '=IFERROR(A1, B1)'),
+        (6, {'A1'}, '=IFERROR(SUM(A1:A3), B1)'),
+        (1, {'B1'}, '=IFERROR(1/0, B1)'),
+        (1, {'B1'}, '=CHOOSE(2, A1, B1, C1)'),
+        (4, {'C1'}, '=CHOOSE(3, A1, B1, C1 + 3)'),
+        (2, {'A1', 'C1'}, '=IF(A1, IF(C1, 2, B1), B1)'),
+    )
+)
+def test_lazy_evaluation(result, evaluated, formula):
+    needed = []
+
+    def evaluate(address):
+        needed.append(address)
+        return 'x' if address == 'D1' else 1
+
+    def evaluate_range(address):
+        needed.append(address)
+        return ((1, ), (2, ), (3, ))
+
+    eval_context = ExcelFormula.build_eval_context(evaluate, evaluate_range)
+    assert result == eval_context(ExcelFormula(formula))
+    assert evaluated == {a.split(':')[0] for a in needed}
+
+
 @pytest.mark.parametrize(
     'formula', (
         '=if(1',
@@ -530,6 +566,44 @@ def test_build_eval_context(result, formula):
     assert eval_context(ExcelFormula(formula)) == pytest.approx(result)
 
 
+def test_error_literals():
+    eval_ctx = ExcelFormula.build_eval_context(
+        lambda x: '#N/A', lambda x: [['#N/A']])
+
+    assert 2 == eval_ctx(ExcelFormula('=IFERROR(#N/A, 2)'))
+    assert NA_ERROR == eval_ctx(ExcelFormula('=#N/A'))
+    assert is_error(eval_ctx(ExcelFormula('=#N/A')))
+
+    # text which looks like an error code is not an error
+    assert '#N/A' == eval_ctx(ExcelFormula('=IFERROR("#N/A", 2)'))
+    assert '#N/A' == eval_ctx(ExcelFormula('=IFERROR(A1, 2)'))
+    assert not is_error(eval_ctx(ExcelFormula('="#N/A"')))
+
+
+@pytest.mark.parametrize(
+    'result, formula', (
+        (58, '=SUMPRODUCT(A1:B2, C1:D2)'),
+        (16, '=SUMPRODUCT((A1:B2>1)*A1:B2, E1:F2)'),
+        (VALUE_ERROR, '=SUMPRODUCT(A1:B2*C1:D2)'),
+        (20, '=SUM(A1:B2*2)'),
+        (3, '=COUNT(A1:B2/C1:D2)'),
+        (((7, 10), (15, 22)), '=MMULT(A1:B2, A1:B2)'),
+        (((1, 3), (2, 4)), '=TRANSPOSE(A1:B2)'),
+        (2, '=INDEX(LINEST(A1:B2, E1:F2), 1, 1, 1, 2)'),
+        (11.5, '=ROUND(_xlfn.FORECAST.LINEAR(6, A1:B2, E1:F2), 9)'),
+    )
+)
+def test_array_functions(result, formula):
+    ranges = {
+        'A1:B2': ((1, 2), (3, 4)),
+        'C1:D2': ((5, 'x'), (7, 8)),
+        'E1:F2': ((1, 1), (2, 2)),
+    }
+    eval_context = ExcelFormula.build_eval_context(
+        lambda x: None, lambda x: ranges[x])
+    assert result == eval_context(ExcelFormula(formula))
+
+
 def test_math_wrap():
     eval_context = ExcelFormula.build_eval_context(
         lambda x: None, lambda x: DIV0)
@@ -864,6 +938,50 @@ def test_lineno_on_error_reporting():
         eval_ctx(excel_formula)
 
 
+def test_resolve_reference():
+    resolved = []
+    values = dict(A1=2, B1=3)
+
+    def resolve_reference(address):
+        resolved.append(address)
+        return values[address] if address in values else address
+
+    eval_ctx = ExcelFormula.build_eval_context(
+        lambda x: x, lambda x: ((x, 1),), resolve_reference=resolve_reference)
+
+    formula = ExcelFormula('=A1 + A1 * B1 + SUM(C1:C2)')
+    assert 9 == eval_ctx(formula)
+    assert ['A1', 'B1', 'C1:C2'] == resolved
+
+    # the references are only bound when loaded
+    assert 9 == eval_ctx(formula)
+    assert ['A1', 'B1', 'C1:C2'] == resolved
+
+
+def test_load_functions():
+    eval_ctx = ExcelFormula.build_eval_context(
+        lambda x: 2, lambda x: ((1, 2), (3, 4)), logging.getLogger('pycel_x'))
+
+    formulas = [ExcelFormula(f) for f in (
+        '=A1+1', '=SUM(A1:B2)', '=IF(A1>1,"big","small")', '=xyzzy()')]
+    parse_error = ExcelFormula('')
+    parse_error._python_code = '1 +'
+    formulas.append(parse_error)
+
+    eval_ctx.load_functions(formulas)
+    assert all(f.compiled_lambda is not None for f in formulas[:-1])
+    assert formulas[-1].compiled_lambda is None
+
+    assert [3, 10, 'big'] == [eval_ctx(f) for f in formulas[:3]]
+
+    msg = 'Function XYZZY has not been implemented.'
+    with pytest.raises(UnknownFunction, match=msg):
+        eval_ctx(formulas[3])
+
+    with pytest.raises(FormulaParserError):
+        eval_ctx(formulas[4])
+
+
 @pytest.mark.parametrize(
     'msg, formula', (
         ("Function XYZZY has not been implemented. "
@@ -1,5 +1,6 @@
 import datetime as dt
 import math
+import random
 
 import numpy as np
 import pytest
@@ -7,6 +8,9 @@ from pycel.excellib import (
     # ::TODO:: finish test cases for remainder of functions
     _numerics,
     average,
+    averageif,
+    averageifs,
+    choose,
     column,
     concat,
     concatenate,
@@ -14,14 +18,19 @@ from pycel.excellib import (
     countif,
     countifs,
     date,
+    forecast,
+    growth,
     hlookup,
     index,
     isNa,
     istext,
-    # linest,
+    LOOKUP_CACHE_MIN_SIZE,
+    lookup_cache,
+    linest,
     lookup,
     match,
     mid,
+    mmult,
     mod,
     npv,
     power,
@@ -30,6 +39,9 @@ from pycel.excellib import (
     row,
     sumif,
     sumifs,
+    sumproduct,
+    transpose,
+    trend,
     value as lib_value,
     vlookup,
     xatan2,
@@ -49,6 +61,7 @@ from pycel.excelutil import (
     NAME_ERROR,
     NUM_ERROR,
     PyCelException,
+    REF_ERROR,
     VALUE_ERROR,
 )
 
@@ -73,6 +86,31 @@ def test_average():
     assert DIV0 == average((2, DIV0))
 
 
+@pytest.mark.parametrize(
+    'index, result', (
+        (1, 'a'),
+        (2, 'b'),
+        ('3', 'c'),
+        (3.7, 'c'),
+        (0, VALUE_ERROR),
+        (4, VALUE_ERROR),
+        (True, VALUE_ERROR),
+        (None, VALUE_ERROR),
+        ('x', VALUE_ERROR),
+        (NA_ERROR, NA_ERROR),
+    )
+)
+def test_choose(index, result):
+    assert result == choose(index, 'a', 'b', 'c')
+
+
+def test_choose_lazy():
+    def not_called():
+        raise AssertionError('should not be evaluated')
+
+    assert 'b' == choose(2, not_called, lambda: 'b', not_called)
+
+
 @pytest.mark.parametrize(
     'address, expected', (
         ('L45', 12),
@@ -103,9 +141,10 @@ def test_column(address, expected):
     'args, result', (
         ('a 1 abc'.split(), 'a1abc'),
         ('a Jan-00 abc'.split(), 'aJan-00abc'),
-        ('a	#DIV/0! abc'.split(), DIV0),
-        ('a	1 #DIV/0!'.split(), DIV0),
-        ('a #NAME? abc'.split(), NAME_ERROR),
+        (('a', DIV0, 'abc'), DIV0),
+        (('a', '1', DIV0), DIV0),
+        (('a', NAME_ERROR, 'abc'), NAME_ERROR),
+        ('a #N/A abc'.split(), 'a#N/Aabc'),
         (('a', True, 'abc'), 'aTRUEabc'),
         (('a', False, 'abc'), 'aFALSEabc'),
         (('a', 2, 'abc'), 'a2abc'),
@@ -127,10 +166,17 @@ class TestCount:
         assert 2 == count([1, True, 'e'], True, 'r')
 
     def test_with_text_representations(self):
-        assert 4 == count([1, '2.2', 'e'], True, '20')
+        # numeric text is only counted as an argument, not in a range
+        assert 3 == count([1, '2.2', 'e'], True, '20')
 
     def test_with_date_representations(self):
-        assert 4 == count([1, '2.2', dt.datetime.now()], True, '20')
+        assert 3 == count([1, '2.2', dt.datetime.now()], True, '20')
+
+    def test_with_ranges(self):
+        assert 3 == count(((1, 'a'), (2.5, True)), (3, ))
+        assert 2 == count((('4', ), (1, ), (2, )))
+        assert 2 * LOOKUP_CACHE_MIN_SIZE == count(
+            (('4', 1, 2), ) * LOOKUP_CACHE_MIN_SIZE)
 
 
 class TestCountIf:
@@ -159,6 +205,19 @@ class TestCountIf:
     def test_countif_regular(self):
         assert 2 == countif([7, 25, 13, 25], 25)
 
+    def test_countif_with_empty(self):
+        assert 2 == countif([7, None, 13, 'a'], '>5')
+
+    def test_countif_range(self):
+        assert 3 == countif(((7, 25), (13, 25), (1, 2)), '>10')
+
+    def test_countif_large_numbers(self):
+        # numbers numpy can not compare exactly are checked one by one
+        assert 1 == countif((None, 10 ** 17, 1), '>1')
+        assert 2 == countif((None, 10 ** 17, 1), '<>1')
+        assert 1 == countif(('a', 10 ** 17, None), 'a*')
+        assert 1 == countif(('ab', 10 ** 17, 'b'), '<b')
+
 
 class TestCountIfs:
     # more tests might be welcomed
@@ -166,6 +225,15 @@ class TestCountIfs:
     def test_countifs_regular(self):
         assert 1 == countifs([7, 25, 13, 25], 25, [100, 102, 201, 20], ">100")
 
+    def test_countifs_different_lengths(self):
+        assert 1 == countifs([7, 25, 13, 25], 25, [100, 102, 201], ">100")
+
+    def test_countifs_large_numbers(self):
+        assert 1 == countifs(
+            (None, 10 ** 17, 1, 'ab'), '>1', ('x', 'x', 'x', 'x'), 'x*')
+        assert 1 == countifs(
+            (None, 10 ** 17, 1, 'ab'), 'a*', (2 ** 60, 1, 1, 1), '>0')
+
     def test_countifs_odd_args_len(self):
         with pytest.raises(PyCelException):
             countifs([7, 25, 13, 25], 25, [100, 102, 201, 20])
@@ -395,6 +463,144 @@ lookup_rows = lookup_vector, lookup_result
 lookup_columns = tuple(zip(*lookup_rows))
 
 
+class TestLinest:
+
+    ys = ((1, ), (3, ), (5.5, ), (6.5, ), (9, ))
+    xs = ((1, ), (2, ), (3, ), (4, ), (5, ))
+    xs2 = ((1, 2), (2, 1), (3, 5), (4, 3), (5, 7))
+
+    @classmethod
+    def assert_approx(cls, expected, result):
+        if isinstance(expected, tuple):
+            assert len(expected) == len(result)
+            for expected_item, item in zip(expected, result):
+                cls.assert_approx(expected_item, item)
+        elif isinstance(expected, str):
+            assert expected == result
+        else:
+            assert result == pytest.approx(expected)
+
+    def test_linest(self):
+        self.assert_approx(((1.95, -0.85), ), linest(self.ys, self.xs))
+        assert linest(self.ys) == linest(self.ys, self.xs)
+        assert linest(((1, 3, 5.5, 6.5, 9), )) == linest(self.ys, self.xs)
+
+        slope = np.dot((1, 3, 5.5, 6.5, 9), range(1, 6)) / 55
+        self.assert_approx(((slope, 0), ), linest(self.ys, self.xs, False))
+
+    def test_stats(self):
+        self.assert_approx((
+            (1.95, -0.85),
+            (0.1258306, 0.4173328),
+            (0.9876623, 0.3979112),
+            (240.1578947, 3),
+            (38.025, 0.475),
+        ), linest(self.ys, self.xs, True, True))
+
+        # the degrees of freedom are an int
+        df = linest(self.ys, self.xs, True, True)[3][1]
+        assert 3 == df
+        assert isinstance(df, int)
+
+        # text logicals
+        assert linest(self.ys, self.xs) == linest(
+            self.ys, self.xs, 'TRUE', 'FALSE')
+        assert linest(self.ys, self.xs, True, True) == linest(
+            self.ys, self.xs, True, 'true')
+        assert linest(self.ys, self.xs, False) == linest(
+            self.ys, self.xs, 'FALSE')
+
+    def test_multiple_xs(self):
+        result = linest(self.ys, self.xs2, True, True)
+        coefs = np.linalg.lstsq(
+            np.hstack((self.xs2, np.ones((5, 1)))), np.ravel(self.ys),
+            rcond=None)[0]
+        self.assert_approx(
+            (coefs[1], coefs[0], coefs[2]), result[0])
+        assert (NA_ERROR, ) * 6 == tuple(row[2] for row in result[2:]) * 2
+
+        # the x variables are rows for a row of y's
+        self.assert_approx(result, linest(
+            tuple(zip(*self.ys)), tuple(zip(*self.xs2)), True, True))
+
+        result = linest(self.ys, self.xs2, False, True)
+        assert 0 == result[0][2]
+        assert NA_ERROR == result[1][2]
+
+    def test_polynomial(self):
+        expected = tuple(np.polyfit(range(1, 6), np.ravel(self.ys), 2))
+        xs = tuple((x, x ** 2) for x, in self.xs)
+        self.assert_approx(expected, linest(self.ys, xs)[0])
+
+        # as emitted by func_linest()
+        self.assert_approx(expected, linest(self.ys, self.xs, degree=2))
+        assert linest(self.ys, self.xs)[0] == \
+            linest(self.ys, self.xs, degree=-1)
+
+    def test_errors(self):
+        assert REF_ERROR == linest(self.ys, ((1, ), (2, )))
+        assert VALUE_ERROR == linest(((1, ), ('a', )))
+        assert VALUE_ERROR == linest(((1, ), (None, )))
+        assert NA_ERROR == linest(((1, ), (NA_ERROR, )))
+        assert DIV0 == linest(self.ys, self.xs, DIV0)
+        assert DIV0 == linest(self.ys, self.xs, True, DIV0)
+        assert NUM_ERROR == linest(((1, ), (2, )), None, True, True)[2][1]
+
+    def test_cached_fit(self):
+        lookup_cache.clear()
+        first = linest(self.ys, self.xs, True, True)
+        assert first is linest(self.ys, self.xs, True, True)
+        assert 1 == lookup_cache.misses
+        assert first[:1] == linest(self.ys, self.xs)
+        assert first[0][1] == trend(self.ys, self.xs, 0)
+        assert 1 == lookup_cache.misses
+
+        # lists can be changed, so are not cached
+        assert first == linest(list(self.ys), self.xs, True, True)
+        assert 1 == lookup_cache.misses
+
+        # a different fit of the same y's
+        assert first != linest(self.ys, self.xs, False, True)
+        assert 2 == lookup_cache.misses
+
+    def test_trend(self):
+        self.assert_approx(((1.1, ), (3.05, ), (5.0, ), (6.95, ), (8.9, )),
+                           trend(self.ys))
+        assert trend(self.ys, self.xs, 6) == pytest.approx(10.85)
+        self.assert_approx(((10.85, 12.8), ), trend(self.ys, None, ((6, 7), )))
+        assert trend(self.ys, self.xs, 6, False) == pytest.approx(
+            6 * linest(self.ys, self.xs, False)[0][0])
+
+        coefs = linest(self.ys, self.xs2)[0]
+        self.assert_approx(((coefs[1] * 6 + coefs[0] + coefs[2], ), ),
+                           trend(self.ys, self.xs2, ((6, 1), )))
+        assert REF_ERROR == trend(self.ys, self.xs2, ((6, 1, 1), ))
+        assert VALUE_ERROR == trend(self.ys, self.xs, 'a')
+        assert NA_ERROR == trend(self.ys, self.xs, ((NA_ERROR, ), ))
+
+    def test_growth(self):
+        ys = tuple((2.0 ** x, ) for x, in self.xs)
+        self.assert_approx(ys, growth(ys))
+        assert growth(ys, self.xs, 6) == pytest.approx(64)
+        self.assert_approx(((64, 128), ), growth(ys, self.xs, ((6, 7), )))
+        assert NUM_ERROR == growth(((1, ), (0, )))
+
+    @pytest.mark.parametrize(
+        'x, known_ys, known_xs, expected', (
+            (6, ys, xs, 10.85),
+            (6, ys, (tuple(x for x, in xs), ), 10.85),
+            ('6', ys, xs, 10.85),
+            (DIV0, ys, xs, DIV0),
+            ('a', ys, xs, VALUE_ERROR),
+            (6, ys, xs[:4], NA_ERROR),
+            (6, ((1, ), (2, )), ((3, ), (3, )), DIV0),
+            (6, ((1, ), (NA_ERROR, )), ((3, ), (4, )), NA_ERROR),
+        )
+    )
+    def test_forecast(self, x, known_ys, known_xs, expected):
+        self.assert_approx(expected, forecast(x, known_ys, known_xs))
+
+
 @pytest.mark.parametrize(
     'lookup_value, result1, result2', (
         ('A', NA_ERROR, NA_ERROR),
@@ -458,6 +664,53 @@ def test_match(lookup_value, lookup_array, match_type, result):
     assert result == match(lookup_value, lookup_array, match_type)
 
 
+def test_match_exact_index():
+    lookup_array = (None, 1, 'a', True, DIV0, 2.0, 'B', False, 1, 'A') * 2
+    assert len(lookup_array) >= LOOKUP_CACHE_MIN_SIZE
+
+    lookup_cache.clear()
+    for lookup_value, expected in (
+            (0, 1), (1, 2), (1.0, 2), ('A', 3), ('b', 7), (True, 4),
+            (False, 8), (2, 6), (3, NA_ERROR), ('', NA_ERROR), ('1', NA_ERROR),
+            (DIV0, DIV0)):
+        assert expected == match(lookup_value, lookup_array, 0)
+        assert expected == match(lookup_value, list(lookup_array), 0)
+    assert lookup_cache.misses == 1
+    assert lookup_cache.hits == 10
+
+    # wildcards do not use the index
+    assert 3 == match('?', lookup_array, 0)
+
+
+def test_match_approximate_keys():
+    values = (None, 0, 1, 2, 2.5, 'a', 'B', 'c', True, False, DIV0, NA_ERROR)
+    rand = random.Random(42)
+    for length in range(LOOKUP_CACHE_MIN_SIZE, 3 * LOOKUP_CACHE_MIN_SIZE):
+        lookup_array = tuple(rand.choice(values) for i in range(length))
+        for sort in (False, True):
+            if sort:
+                lookup_array = tuple(sorted(
+                    lookup_array, key=lambda v: ExcelCmp(v, ExcelCmp(1))))
+            for lookup_value in values + (-1, 3, 'b', 'z', ''):
+                # the list is not cached, so takes the original path
+                assert match(lookup_value, list(lookup_array)) == \
+                    match(lookup_value, lookup_array)
+
+
+@pytest.mark.parametrize(
+    'lookup_array, match_type, result', (
+        (((1, 2, 3),), 1, 2),
+        (((1,), (2,), (3,)), 1, 2),
+        (((1,), (2,), (3,)), 0, 2),
+        (((1,), (2,), (3,)) * 6, 0, 2),
+        (((3,), (2,), (1,)), -1, 2),
+        (((1, 2), (3, 4)), 0, NA_ERROR),
+    )
+)
+def test_match_range(lookup_array, match_type, result):
+    assert result == match(2, lookup_array, match_type)
+
+
 @pytest.mark.parametrize(
     'lookup_array, lookup_value, result1, result0, resultm1', (
         (('a', 'b', 'c', 'd', 'e'), 'c', 3, 3, '#N/A'),  # 0
@@ -590,6 +843,32 @@ class TestMid:
         assert 'om' == mid('Romain', 2, 2.1)
 
 
+@pytest.mark.parametrize(
+    'array1, array2, expected', (
+        (((1, 2), (3, 4)), ((5, ), (6, )), ((17, ), (39, ))),
+        (((1, 2), (3, 4)), ((1, 0), (0, 1)), ((1, 2), (3, 4))),
+        (((1, 2.5), ), ((2, ), (2, )), ((7.0, ), )),
+        ((1, 2), ((3, ), (4, )), ((11, ), )),
+        (2, 3, ((6, ), )),
+        (((1, 2), ), ((1, 2), ), VALUE_ERROR),
+        (((1, 'a'), ), ((1, ), (2, )), VALUE_ERROR),
+        (((1, None), ), ((1, ), (2, )), VALUE_ERROR),
+        (((1, True), ), ((1, ), (2, )), VALUE_ERROR),
+        (((1, 2), ), ((NA_ERROR, ), (2, )), NA_ERROR),
+        (((1, 2), ), ((NA_ERROR, ), ), VALUE_ERROR),
+        ((), ((1, ), ), VALUE_ERROR),
+        (((1, ), ), (), VALUE_ERROR),
+        (((), ), ((), ), VALUE_ERROR),
+    )
+)
+def test_mmult(array1, array2, expected):
+    result = mmult(array1, array2)
+    assert expected == result
+    if expected not in (VALUE_ERROR, NA_ERROR):
+        assert [type(x) for row in expected for x in row] == \
+            [type(x) for row in result for x in row]
+
+
 class TestMod:
 
     def test_first_argument_validity(self):
@@ -782,6 +1061,120 @@ class TestSumIfs:
                            [1, 2, 3, 4, 5], ">=3",
                            [1, 2, 3, 4, 5], "<=4")
 
+    def test_errors(self):
+        assert DIV0 == sumifs([1, DIV0, 3], [1, 2, 3], ">=2")
+        assert 4 == sumifs([1, DIV0, 3], [1, 2, 3], "<>2")
+
+    def test_ranges(self):
+        assert 10 == sumifs(((1, 2), (3, 4)), ((1, 2), (3, 4)), '>0')
+        values = tuple((i, ) for i in range(20))
+        assert 45 == sumifs(values, values, '<10')
+        assert 45 == sumifs(values, values, '<10')
+
+
+def test_ifs_group_index():
+    rand = random.Random(42)
+    size = 3 * LOOKUP_CACHE_MIN_SIZE
+    keys = tuple(rand.choice((1, 2, 'a', 'B', None)) for i in range(size))
+    others = tuple(rand.choice(('x', 'y', 3)) for i in range(size))
+    values = tuple(rand.choice((1, 2.5, True, None, 'a', 4))
+                   for i in range(size))
+
+    lookup_cache.clear()
+    for key in (1, 2, 'a', 'b', '=B', 'c', 3, 1, 'a'):
+        for other in ('x', 'Y', 3):
+            args = (keys, key, others, other)
+            list_args = tuple(map(list, args[0::2]))
+            list_args = (list_args[0], key, list_args[1], other)
+            assert sumifs(list(values), *list_args) == sumifs(values, *args)
+            assert countifs(*list_args) == countifs(*args)
+            assert averageifs(list(values), *list_args) == \
+                averageifs(values, *args)
+            assert countif(list(keys), key) == countif(keys, key)
+
+    groups = lookup_cache.get(keys, ('groups', id(others)), None)
+    assert groups.rows is not None
+
+
+class TestAverageIfs:
+
+    def test_averageif(self):
+        assert 4 == averageif([1, 2, 3, 4, 5], ">=3")
+        assert 222 == averageif([1, 2, 3, 4, 5], ">=4", [0, 0, 0, 111, 333])
+        assert DIV0 == averageif([1, 2, 3, 4, 5], ">5")
+
+    def test_averageifs(self):
+        assert 3.5 == averageifs([1, 2, 3, 4, 5],
+                                 [1, 2, 3, 4, 5], ">=3",
+                                 [1, 2, 3, 4, 5], "<=4")
+        assert 2 == averageifs([1, True, 3, 'a', None],
+                               [1, 2, 3, 4, 5], "<>2")
+        assert NA_ERROR == averageifs([1, NA_ERROR], [1, 2], ">0")
+
+    def test_average_range_not_list(self):
+        with pytest.raises(TypeError):
+            averageifs('JUNK', [], [], )
+
+
+@pytest.mark.parametrize(
+    'arrays, expected', (
+        ((((1, 2), (3, 4)), ((1, 2), (3, 4))), 30),
+        ((((1, 2), (3, 4)), ((1, 2), (3, 4)), ((0, 1), (1, 0))), 13),
+        ((((1, 2), (3, 4)), ), 10),
+        ((((1.5, 2), (3, 4)), ((2, 2), (2, 2))), 21.0),
+        ((((1, 'a'), (None, True)), ((3, 4), (5, 6))), 3),
+        ((((1, '2'), ), ((3, 4), )), 3),
+        ((((1, 2), ), ((1, ), (2, ))), VALUE_ERROR),
+        ((((1, 2), ), 1), VALUE_ERROR),
+        ((((1, NA_ERROR), ), ((DIV0, 1), )), NA_ERROR),
+        ((((1, NA_ERROR), ), ((1, 2, 3), )), VALUE_ERROR),
+        (((1, 2, 3), (4, 5, 6)), 32),
+        ((3, ), 3),
+        ((((2 ** 53, 1), ), ((2, 1), )), float(2 ** 54 + 1)),
+        (((), ), VALUE_ERROR),
+        (((), ()), VALUE_ERROR),
+        ((((), ), ), VALUE_ERROR),
+        ((), VALUE_ERROR),
+    )
+)
+def test_sumproduct(arrays, expected):
+    result = sumproduct(*arrays)
+    assert expected == result
+    assert type(expected) is type(result)
+
+
+def test_sumproduct_ranges():
+    rand = random.Random(40)
+    rows = LOOKUP_CACHE_MIN_SIZE + 5
+    values = tuple(
+        tuple(rand.choice((1, 2, 3.5, -1, 'a', None, True))
+              for _ in range(2)) for _ in range(rows))
+    weights = tuple((rand.randint(0, 9), ) * 2 for _ in range(rows))
+
+    def number(x):
+        return x if isinstance(x, (int, float)) and \
+            not isinstance(x, bool) else 0
+
+    expected = sum(number(v) * number(w)
+                   for v_row, w_row in zip(values, weights)
+                   for v, w in zip(v_row, w_row))
+    assert expected == sumproduct(values, weights)
+    assert expected == sumproduct(values, weights)
+    assert xsum(values) == sumproduct(values)
+
+
+@pytest.mark.parametrize(
+    'array, expected', (
+        (((1, 2), (3, 4)), ((1, 3), (2, 4))),
+        (((1, 2, 3), ), ((1, ), (2, ), (3, ))),
+        (((1, ), (NA_ERROR, ), (None, )), ((1, NA_ERROR, None), )),
+        ((1, 'a'), ((1, ), ('a', ))),
+        (5, 5),
+    )
+)
+def test_transpose(array, expected):
+    assert expected == transpose(array)
+
 
 def test_value():
     assert 0.123 == lib_value('.123')
@@ -954,6 +1347,30 @@ def test_xsum():
     assert DIV0 == xsum((2, DIV0))
 
 
+def test_numeric_reductions_of_ranges():
+    rand = random.Random(42)
+    choices = (1, 2, -3, 2.5, 0.1, 1 / 3, 1e10 / 7, True, False, None, 'a',
+               '4', 2 ** 60)
+    size = 2 * LOOKUP_CACHE_MIN_SIZE
+    for i in range(20):
+        rng = tuple(rand.choice(choices[:-1] if i % 2 else choices)
+                    for j in range(size))
+        if i % 5 == 4:
+            rng = rng[:-1] + (rand.choice((DIV0, NA_ERROR)), )
+        rng_2d = tuple(zip(rng[0::2], rng[1::2]))
+
+        for func in (average, count, xmax, xmin, xsum):
+            # the lists are not cached, so take the original path
+            expected = func(list(rng))
+            for result in (func(rng), func(rng_2d)):
+                assert type(expected) is type(result)
+                assert result == expected
+
+            result = func(0.1, rng, '2', 1 / 3)
+            expected = func(0.1, list(rng), '2', 1 / 3)
+            assert result == expected
+
+
 class TestYearfrac:
 
     def test_start_date_must_be_number(self):
@@ -1,34 +1,50 @@
 import math
 import os
 import pickle
+import random
 from collections import namedtuple
 
+import numpy as np
 import pytest
 from openpyxl.utils import column_index_from_string, quote_sheetname
 from pycel.excelutil import (
     AddressCell,
     AddressRange,
+    as_error,
     assert_list_like,
+    build_wildcard_re,
     build_operator_operand_fixup,
     coerce_to_number,
     coerce_to_string,
     criteria_parser,
+    CriteriaColumn,
+    CriteriaGroups,
     date_from_int,
+    ERROR_CODES,
     ExcelCmp,
+    ExcelError,
     find_corresponding_index,
+    flat_values,
     flatten,
     get_linest_degree,
     get_max_days_in_month,
+    is_error,
     is_leap_year,
     is_number,
     list_like,
     MAX_COL,
     MAX_ROW,
     math_wrap,
+    MemoizedFunction,
+    NA_ERROR,
     NUM_ERROR,
     normalize_year,
     OPERATORS,
+    parse_criteria,
     PyCelException,
+    RangeCache,
+    RangeIndex,
+    RangeValue,
     range_boundaries,
     split_sheetname,
     structured_reference_boundaries,
@@ -87,6 +103,25 @@ def test_address_range_errors():
         AddressRange('B32:B')
 
 
+def test_address_interned():
+    assert AddressRange('s!A1:B2') is AddressRange('s!A1:B2')
+    assert AddressRange('A1:B2', sheet='s') is AddressRange.create(
+        'A1:B2', sheet='s')
+    assert AddressCell('s!C3') is AddressRange('s!C3')
+    assert AddressRange('A1:B2', sheet='s') == AddressRange('s!A1:B2')
+
+    # errors are not cached
+    for i in range(2):
+        with pytest.raises(ValueError, match='not a valid coordinate'):
+            AddressCell('s!A1:B2')
+
+    # relative addresses depend on the cell, so are not interned
+    cell = namedtuple('cell', 'row col_idx')(2, 3)
+    assert AddressRange.create('R[1]C[1]', cell=cell) is not \
+        AddressRange.create('R[1]C[1]', cell=cell)
+    assert AddressRange.create('R[1]C[1]', cell=cell) == AddressCell('D3')
+
+
 @pytest.mark.parametrize(
     'left, right, result', (
         ('a1:b2', 'b1:c3', 'a1:c3'),
@@ -199,6 +234,30 @@ def test_address_range_columns():
     assert all('C' == addr.column for addr in columns[-1])
 
 
+@pytest.mark.parametrize('address', ('B2:D4', 'sh!A1:AB3', "'s h'!Z9:AA9"))
+def test_address_range_cells(address):
+    address = AddressRange(address)
+
+    def build(col_idx, row):
+        return AddressCell((col_idx, row, col_idx, row), sheet=address.sheet)
+
+    rows = address.resolve_range
+    assert rows == tuple(tuple(build(cell.col_idx, cell.row) for cell in row)
+                         for row in rows)
+    assert tuple(map(tuple, address.cols)) == tuple(zip(*rows))
+    assert all(type(cell) is AddressCell for row in rows for cell in row)
+    assert rows[0][0] == address.start
+    assert rows[-1][-1] == address.end
+    assert all(address.sheet == cell.sheet for row in rows for cell in row)
+
+
+def test_address_cell_from_indices():
+    assert AddressCell('sh!AA12') == AddressCell.from_indices(27, 12, 'sh')
+    assert AddressCell('C3') == AddressCell.from_indices(3, 3, '', 'C')
+    assert AddressCell((3, 0, 3, 0)) == AddressCell.from_indices(3, 0)
+    assert AddressCell((0, 3, 0, 3)) == AddressCell.from_indices(0, 3)
+
+
 def test_address_pickle(tmpdir):
     addrs = [
         AddressRange('B1'),
@@ -479,6 +538,105 @@ def test_coerce_to_number():
         coerce_to_number(DIV0)
 
 
+@pytest.mark.parametrize(
+    'value', (
+        0, 1, -1, True, False, None, 1.0, 1.5, -0.0, 1e300, 2 ** 60,
+        '1', ' 12 ', '1.', '.5', '-1.5e3', '1e5', '1_000', 'inf', 'nan',
+        '', ' ', 'x', 'xyzzy', '1.2.3', '#N/A', np.float64(2.0),
+        np.float64(2.5), np.int64(3), np.bool_(True),
+    )
+)
+def test_number_coercion_fast_paths(value):
+    """ The fast paths match the plain float() conversions """
+    def expected_is_number(value):
+        try:
+            float(value)
+            return True
+        except (ValueError, TypeError):
+            return False
+
+    def expected_coerce_to_number(value):
+        if not isinstance(value, str):
+            if isinstance(value, int):
+                return value
+            if expected_is_number(value) and int(value) == float(value):
+                return int(value)
+            return value
+        try:
+            if '.' not in value:
+                return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+    for i in range(2):
+        assert expected_is_number(value) == is_number(value)
+        expected = expected_coerce_to_number(value)
+        result = coerce_to_number(value)
+        assert type(expected) is type(result)
+        assert expected == result or expected != expected
+
+
+def test_coerce_to_number_special_floats():
+    assert math.isinf(coerce_to_number(float('inf')))
+    assert math.isnan(coerce_to_number(float('nan')))
+    assert DIV0 == coerce_to_number(DIV0, raise_div0=False)
+
+
+def test_excel_error():
+    assert ExcelError('#N/A') is NA_ERROR
+    assert ExcelError(NA_ERROR) is NA_ERROR
+    assert '#N/A' == NA_ERROR
+    assert {'#N/A'} == {NA_ERROR}
+    assert '#N/A' == str(NA_ERROR)
+    assert type(str(NA_ERROR)) is str
+    assert pickle.loads(pickle.dumps(NA_ERROR)) is NA_ERROR
+    assert all(type(error) is ExcelError for error in ERROR_CODES)
+
+    with pytest.raises(ValueError):
+        ExcelError('#XYZZY!')
+
+
+@pytest.mark.parametrize(
+    'value, result', (
+        (NA_ERROR, True),
+        (DIV0, True),
+        ('#N/A', False),
+        ('#N/A ', False),
+        ('text', False),
+        (1, False),
+        (1.5, False),
+        (None, False),
+        ((1, 2), False),
+        ([1, 2], False),
+        (np.array((1, 2)), False),
+    )
+)
+def test_is_error(value, result):
+    assert is_error(value) is result
+    assert not is_number(value) or not result
+
+
+def test_as_error():
+    assert as_error('#N/A') is NA_ERROR
+    assert as_error(DIV0) is DIV0
+    assert is_error(as_error('#REF!'))
+    assert as_error('#N/A ') == '#N/A '
+    assert as_error('text') == 'text'
+    assert as_error(1) == 1
+    assert as_error(None) is None
+
+
+def test_coerce_excel_error():
+    assert NA_ERROR is coerce_to_number(NA_ERROR)
+    assert DIV0 is coerce_to_number(DIV0, raise_div0=False)
+    with pytest.raises(ZeroDivisionError):
+        coerce_to_number(DIV0)
+
+
 @pytest.mark.parametrize(
     'value, result', (
         (True, 'TRUE'),
@@ -564,6 +722,29 @@ def test_flatten():
     assert [1.0] == list(flatten(1.0))
 
 
+def test_range_value():
+    value = RangeValue(((1, 'a'), (None, 2.5), (True, DIV0)))
+    assert ((1, 'a'), (None, 2.5), (True, DIV0)) == value
+    assert (3, 2) == value.shape
+    assert (1, 'a', None, 2.5, True, DIV0) == value.flat
+    assert value.flat is value.flat
+    assert value.flat is flat_values(value)
+    assert value.flat == flat_values(tuple(value))
+    assert (0, 0) == RangeValue(()).shape
+
+    assert list(value.flat) == list(flatten(value))
+    assert [1, 'a', None, 2.5, True, DIV0, 3] == list(flatten((value, 3)))
+    assert [1, 'a', 2, 2.5, 1, DIV0] == list(
+        flatten(value, lambda row: tuple(coerce_to_number(x, False)
+                                         if x is not None else 2
+                                         for x in row)))
+
+    unpickled = pickle.loads(pickle.dumps(value))
+    assert type(unpickled) is RangeValue
+    assert value == unpickled
+    assert value.flat == unpickled.flat
+
+
 def test_uniqueify():
     assert (1, 2, 3, 4) == uniqueify((1, 2, 3, 4, 3))
     assert (4, 1, 2, 3) == uniqueify((4, 1, 2, 3, 4, 3))
@@ -670,6 +851,125 @@ def test_find_corresponding_index():
         find_corresponding_index(list('ABB'), None)
 
 
+def test_criteria_parser_cache():
+    criteria_parser.cache_clear()
+    parse_criteria.cache_clear()
+    for i in range(3):
+        for criteria in ('>0', 1, 1.0, True, 'A*'):
+            criteria_parser(criteria)
+    info = criteria_parser.cache_info()
+    assert (10, 5) == (info.hits, info.misses)
+    assert criteria_parser('>0') is criteria_parser('>0')
+
+    # typed, so 1 and True are different criteria
+    assert criteria_parser(1) is not criteria_parser(True)
+    assert parse_criteria('=2') == parse_criteria(2)
+
+    # unhashable criteria are not cached
+    with pytest.raises(ValueError):
+        criteria_parser([1])
+    assert 5 == criteria_parser.cache_info().misses
+
+    assert build_wildcard_re('a*') is build_wildcard_re('a*')
+    assert build_wildcard_re('a*') is not None
+    assert build_wildcard_re('a') is None
+
+
+def test_criteria_column():
+    values = (0, 1, 2, 2.0, 2.5, -1, 'a', 'B', 'b', 'ab', 'That', 'Tt', '1x',
+              '2', '2.0', '', True, False, DIV0, '#N/A')
+    criterias = (1, 2, 2.5, '2', '=2', '<2', '<=2', '>2', '>=2', '<>2',
+                 'b', '=B', '<b', '<=b', '>b', '>=b', '<>b', '=', '<>',
+                 'a*', 'T?t', 'T*t', '*', True, '<0x', '>=1x', '#DIV/0!')
+    for column in (CriteriaColumn(values), CriteriaColumn((values, ))):
+        assert column.exact
+        for criteria in criterias:
+            check = criteria_parser(criteria)
+            expected = [check(v) for v in values]
+            assert expected == list(column.mask(criteria))
+
+    # empty cells only meet '<>' or equality criteria, the same whether or
+    # not the column can be compared by numpy
+    for big in (1, 2 ** 60):
+        column = CriteriaColumn((None, 1, 'a', big))
+        assert column.exact is (big == 1)
+        assert [False, True, False, True] == list(column.mask('>0'))
+        assert [False, False, True, False] == list(column.mask('<=b'))
+        assert [True, True, False, True] == list(column.mask('<>a'))
+        assert [True, False, True, big != 1] == list(column.mask('<>1'))
+        assert [False, False, True, False] == list(column.mask('a*'))
+
+    # numbers numpy can not compare exactly fall back to the checks
+    column = CriteriaColumn((2 ** 60, 2 ** 60 + 1, 'a'))
+    assert not column.exact
+    assert [False, True, False] == list(column.mask(2 ** 60 + 1))
+
+    with pytest.raises(ValueError):
+        CriteriaColumn((1, 2)).mask(None)
+
+    with pytest.raises(TypeError):
+        CriteriaColumn('ABB')
+
+
+def test_criteria_column_total():
+    column = CriteriaColumn((1, 2.5, True, None, 'a', '3', 4))
+    mask = column.mask('<>a')
+    assert (8.5, 4) == column.total(mask)
+    assert (7.5, 3) == column.total(mask, no_bools=True)
+    assert (1, 1) == column.total(mask[:1])
+    assert isinstance(column.total(mask[:1])[0], int)
+    assert isinstance(column.total(column.mask('>=4'))[0], int)
+
+    column = CriteriaColumn((1, DIV0, 2, NUM_ERROR))
+    assert DIV0 == column.total(column.mask('<>a'))
+    assert (3, 2) == column.total(column.mask('>0'))
+
+    column = CriteriaColumn((2 ** 60, 1))
+    assert (2 ** 60 + 1, 2) == column.total(column.mask('>0'))
+
+
+@pytest.mark.parametrize(
+    'criteria, expected', (
+        (1, ('n', 1.0)),
+        (True, ('n', 1.0)),
+        ('2', ('n', 2.0)),
+        ('=2.5', ('n', 2.5)),
+        ('B', ('s', 'b')),
+        ('=B', ('s', 'b')),
+        ('', ('s', '')),
+        ('<>B', None),
+        ('>2', None),
+        ('B*', None),
+        (2 ** 60, None),
+        (None, None),
+    )
+)
+def test_criteria_groups_key(criteria, expected):
+    assert expected == CriteriaGroups.key(criteria)
+
+
+def test_criteria_groups():
+    ranges = ((1, 2, '2', True, 'a', 'A', None, 2.0, DIV0),
+              ('x', 'x', 'x', 'y', 'x', 'y', 'x', 'y', 'x', 'extra'))
+    columns = [CriteriaColumn(rng) for rng in ranges]
+    groups = CriteriaGroups(ranges, columns)
+
+    # not an index until used twice, or with a non equality criteria
+    assert groups.select((1, 'x')) is None
+    assert groups.select((1, '>x')) is None
+    assert groups.rows is None
+
+    for criterias in ((1, 'x'), (1, 'y'), (2, 'X'), ('a', 'y'), (3, 'x'),
+                      ('#DIV/0!', 'x'), ('', 'x')):
+        mask = columns[0].mask(criterias[0]) & \
+            columns[1].mask(criterias[1])[:len(ranges[0])]
+        assert list(np.flatnonzero(mask)) == list(groups.select(criterias))
+
+    groups = CriteriaGroups(ranges, [CriteriaColumn((2 ** 60, ))])
+    groups.select((1, ))
+    assert groups.select((1, )) is None
+
+
 @pytest.mark.parametrize(
     'value, expected', (
         ('xyzzy', False),
@@ -865,6 +1165,136 @@ def test_excel_cmp(lval, op, rval, result):
     assert OPERATORS[op](ExcelCmp(lval), rval) == result
 
 
+def test_memoized_function():
+    calls = []
+
+    def func(*args):
+        calls.append(args)
+        return len(args)
+
+    memoized = MemoizedFunction(func, maxsize=2)
+    assert memoized.__name__ == 'func'
+    value = (1, 2)
+    assert 2 == memoized(value, 1)
+    assert 2 == memoized(value, 1)
+    assert 1 == len(calls)
+
+    # equal values of different types, or different ranges, are not shared
+    assert 2 == memoized(value, True)
+    assert 2 == memoized(tuple(list(value)), 1)
+    assert 3 == len(calls)
+    assert (1, 3) == (memoized.hits, memoized.misses)
+    assert 0.25 == memoized.hit_rate
+
+    # unhashable arguments are not cached, nor are lru evicted results
+    assert 1 == memoized([1])
+    assert 2 == memoized(value, 1)
+    assert 5 == len(calls)
+    assert 2 == len(memoized.cache)
+
+    memoized.clear()
+    assert (0, 0) == (memoized.hits, memoized.misses)
+    assert 0 == memoized.hit_rate
+
+
+def test_range_index():
+    index = RangeIndex()
+    index.add('s!B2:D4')
+    index.add('s!C:C', key='column')
+    index.add('s!3:3', key='row')
+    index.add('t!B2:D4', key='other sheet')
+    assert 4 == len(index)
+
+    assert [AddressRange('s!B2:D4')] == index.containing('s!B2')
+    assert {'column', 'row', AddressRange('s!B2:D4')} == set(
+        index.containing('s!C3'))
+    assert ['column'] == index.containing('s!C1000000')
+    assert {'column', AddressRange('s!B2:D4')} == set(
+        index.containing('s!C2:C4'))
+    assert [] == index.containing('s!A1')
+    assert [] == index.containing('u!B2')
+
+    assert {'row', AddressRange('s!B2:D4')} == set(
+        index.overlapping('s!D3:E9'))
+    assert ['row'] == index.overlapping('s!E3:F3')
+
+    index.remove('s!C:C', key='column')
+    index.remove('s!C:C', key='column')
+    assert 3 == len(index)
+    assert ['row'] == index.containing('s!C3:E3')
+
+
+def test_range_index_random():
+    rand = random.Random(44)
+    index = RangeIndex()
+    ranges = []
+    for i in range(300):
+        col, row = rand.randint(1, 40), rand.randint(1, 400)
+        ranges.append(AddressRange((
+            col, row, col + rand.randint(1, 8), row + rand.randint(0, 50)),
+            sheet='s'))
+        index.add(ranges[-1])
+
+    def bounds(address):
+        return (address.start.col_idx, address.start.row,
+                address.end.col_idx, address.end.row)
+
+    for i in range(500):
+        col, row = rand.randint(1, 50), rand.randint(1, 500)
+        address = AddressRange(
+            (col, row, col + rand.randint(0, 3), row + rand.randint(1, 9)),
+            sheet='s')
+        min_col, min_row, max_col, max_row = bounds(address)
+
+        assert set(index.containing(address)) == {
+            r for r, (col_lo, row_lo, col_hi, row_hi) in zip(
+                ranges, map(bounds, ranges))
+            if col_lo <= min_col and max_col <= col_hi and
+            row_lo <= min_row and max_row <= row_hi}
+
+        assert set(index.overlapping(address)) == {
+            r for r, (col_lo, row_lo, col_hi, row_hi) in zip(
+                ranges, map(bounds, ranges))
+            if col_lo <= max_col and min_col <= col_hi and
+            row_lo <= max_row and min_row <= row_hi}
+
+        cell = address.start
+        assert set(index.containing(cell)) == {
+            r for r in ranges if cell in r}
+
+
+def test_range_cache():
+    cache = RangeCache(maxsize=2)
+    builds = []
+
+    def build(value):
+        builds.append(value)
+        return len(value)
+
+    value1, value2, value3 = (1, 2), (1, 2, 3), (4,)
+    assert 2 == cache.get(value1, 'len', build)
+    assert 2 == cache.get(value1, 'len', build)
+    assert 3 == cache.get(value2, 'len', build)
+    assert [value1, value2] == builds
+    assert (1, 2) == (cache.hits, cache.misses)
+
+    # an equal, but different, value is a different version
+    assert 2 == cache.get(tuple(list(value1)), 'len', build)
+    assert 3 == cache.misses
+
+    # least recently used is evicted
+    assert 1 == cache.get(value3, 'len', build)
+    assert 2 == len(cache.cache)
+    cache.get(value2, 'len', build)
+    assert (1, 5) == (cache.hits, cache.misses)
+    cache.get(value2, 'len', build)
+    assert (2, 5) == (cache.hits, cache.misses)
+
+    cache.clear()
+    assert (0, 0) == (cache.hits, cache.misses)
+    assert not cache.cache
+
+
 @pytest.mark.parametrize(
     'left_op, op, right_op, expected',
     [
@@ -1073,3 +1503,34 @@ def test_excel_operator_operand_fixup(left_op, op, right_op, expected):
     elif expected == DIV0 and DIV0 not in (left_op, right_op):
         assert [(True, 'Values: {} {} {}'.format(left_op, op, right_op))
                 ] == error_messages
+
+
+@pytest.mark.parametrize('op', ('Add', 'Sub', 'Mult', 'Div', 'Eq', 'NotEq',
+                                'Lt', 'LtE', 'Gt', 'GtE'))
+@pytest.mark.parametrize('kind', ('numbers', 'errors', 'mixed'))
+def test_excel_operator_operand_fixup_arrays(op, kind):
+    fixup = build_operator_operand_fixup(lambda is_exception, msg: None)
+    choices = [0, 1, 2, -3, 0.0, 2.0, 1.5, -0.25, 1e20]
+    if kind != 'numbers':
+        choices.extend((DIV0, VALUE_ERROR))
+    if kind == 'mixed':
+        choices.extend((None, True, 'a'))
+
+    rand = np.random.RandomState(int.from_bytes(op.encode(), 'little') % 1000)
+    for shape in ((3, 4), (1, 4), (3, 1)):
+        left = rand.choice(np.array(choices, dtype=object), (3, 4))
+        right = rand.choice(np.array(choices, dtype=object), shape)
+        left = tuple(map(tuple, left.tolist()))
+        right = tuple(map(tuple, right.tolist()))
+        result = fixup(left, op, right)
+
+        expected = tuple(
+            tuple(fixup(l_val, op, right[min(i, len(right) - 1)][
+                min(j, len(right[0]) - 1)]) for j, l_val in enumerate(row))
+            for i, row in enumerate(left))
+        assert expected == result
+        assert all(type(e) is type(r)
+                   for e_row, r_row in zip(expected, result)
+                   for e, r in zip(e_row, r_row))
+
+    assert ((fixup(2, op, 4),) * 2,) * 2 == fixup(((2, 2), (2, 2)), op, 4)
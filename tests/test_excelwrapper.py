@@ -1,7 +1,9 @@
 import datetime as dt
 import pytest
 
-from pycel.excelutil import AddressRange
+from openpyxl import Workbook
+from pycel.excelutil import AddressRange, DIV0, ExcelError, NA_ERROR
+from pycel.excelwrapper import _OpxRange
 
 
 def test_connect(unconnected_excel):
@@ -265,3 +267,12 @@ def test_get_entire_rows_columns(excel, result_range, expected_range):
     result = excel.get_range(result_range).values
     expected = excel.get_range(expected_range).values
     assert result == expected
+
+
+def test_error_values():
+    ws = Workbook().active
+    ws['A1'], ws['A2'], ws['A3'] = '#N/A', '#DIV/0!', 'text'
+    values = [_OpxRange.cell_to_value(ws[addr]) for addr in ('A1', 'A2', 'A3')]
+    assert values == ['#N/A', '#DIV/0!', 'text']
+    assert values[:2] == [NA_ERROR, DIV0]
+    assert [type(v) for v in values] == [ExcelError, ExcelError, str]